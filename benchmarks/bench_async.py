@@ -0,0 +1,65 @@
+"""Конкурентность геокодирования при медленном геокодере.
+
+Геокодирует пачку адресов офлайн-геокодером GazetteerGeocoder с
+искусственной задержкой ответа тремя способами: по одному, как раньше
+работал воркер очереди, в пуле потоков и через асинхронный ageocode_many,
+который использует воркер с --concurrency. Запуск из корня проекта:
+
+    python benchmarks/bench_async.py --addresses 100 --delay 0.2 --concurrency 20
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from locations.geocoder import GazetteerGeocoder, ageocode_many  # noqa: E402
+
+
+def sequential(geocoder, addresses, concurrency):
+    return [geocoder.geocode(address) for address in addresses]
+
+
+def threaded(geocoder, addresses, concurrency):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(geocoder.geocode, addresses))
+
+
+def asynchronous(geocoder, addresses, concurrency):
+    return asyncio.run(ageocode_many(geocoder, addresses, concurrency))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--addresses', type=int, default=100)
+    parser.add_argument('--delay', type=float, default=0.2, help='Задержка ответа геокодера, с')
+    parser.add_argument('--concurrency', type=int, default=20)
+    args = parser.parse_args()
+
+    addresses = [f'Москва, ул. Тверская, д. {number}' for number in range(args.addresses)]
+    geocoder = GazetteerGeocoder(
+        delay=args.delay,
+        entries={address: (55.75, 37.61) for address in addresses},
+    )
+
+    baseline = None
+    for name, method in [
+        ('по одному', sequential),
+        ('пул потоков', threaded),
+        ('asyncio', asynchronous),
+    ]:
+        started_at = time.perf_counter()
+        method(geocoder, addresses, args.concurrency)
+        elapsed = time.perf_counter() - started_at
+        baseline = baseline or elapsed
+        print(
+            f"{name:<12} {elapsed:8.2f} с  {args.addresses / elapsed:8.1f} адресов/с  "
+            f"x{baseline / elapsed:.1f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Сравнение расчета расстояний заказ × ресторан.
+
+Считает матрицу 1000 заказов × 200 ресторанов тремя способами: по одной
+паре через geopy, как раньше в view_orders, и через locations.distances
+в режимах haversine и geodesic. Запуск из корня проекта:
+
+    python benchmarks/bench_distances.py --orders 1000 --restaurants 200
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from geopy.distance import distance
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from locations.distances import GEODESIC, HAVERSINE, distance_matrix  # noqa: E402
+
+
+MOSCOW_BOUNDS = ((55.55, 55.95), (37.35, 37.85))
+
+
+def random_points(count, rng):
+    (min_lat, max_lat), (min_lon, max_lon) = MOSCOW_BOUNDS
+    return [
+        (rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon))
+        for _ in range(count)
+    ]
+
+
+def per_pair_geopy(orders, restaurants):
+    return [
+        [distance(order, restaurant).km for restaurant in restaurants]
+        for order in orders
+    ]
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started_at)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--restaurants', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    orders = random_points(args.orders, rng)
+    restaurants = random_points(args.restaurants, rng)
+    pairs = args.orders * args.restaurants
+
+    baseline, expected = measure(lambda: per_pair_geopy(orders, restaurants), 1)
+    print(f"{'geopy по парам':<20} {baseline:8.3f} с  {pairs / baseline:12,.0f} пар/с")
+
+    for mode, repeat in [(HAVERSINE, args.repeat), (GEODESIC, 1)]:
+        elapsed, matrix = measure(
+            lambda: distance_matrix(orders, restaurants, mode=mode), repeat
+        )
+        max_error = max(
+            abs(matrix[row, column] - expected[row][column]) / expected[row][column]
+            for row in range(args.orders)
+            for column in range(args.restaurants)
+            if expected[row][column]
+        )
+        print(
+            f"{mode:<20} {elapsed:8.3f} с  {pairs / elapsed:12,.0f} пар/с  "
+            f"x{baseline / elapsed:.0f}, макс. погрешность {max_error:.3%}"
+        )
+
+
+if __name__ == '__main__':
+    main()
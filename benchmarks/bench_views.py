@@ -0,0 +1,195 @@
+"""Микробенчмарки API каталога, приема заказов и страниц менеджера.
+
+Создает временную тестовую базу, заполняет ее командой
+generate_bench_data и замеряет через тестовый клиент Django время
+ответа и число SQL-запросов product_list_api, register_order,
+view_orders и view_products. Если запросов больше, чем в QUERY_BUDGETS,
+скрипт завершается с ошибкой. Результаты пишутся в JSON и могут
+сравниваться с прошлым прогоном. Запуск из корня проекта:
+
+    python benchmarks/bench_views.py --output bench.json --compare baseline.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'star_burger.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth.models import User  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from django.test.runner import DiscoverRunner  # noqa: E402
+
+from foodcartapp.models import Product  # noqa: E402
+
+
+# Запросов на один «теплый» вызов, когда кэши уже заполнены. Страницы
+# менеджера считаются вместе с чтением сессии и пользователя, BEGIN и
+# COMMIT не считаются
+QUERY_BUDGETS = {
+    'product_list_api': 0,
+    'register_order': 6,
+    'view_orders': 9,
+    'view_products': 7,
+}
+TRANSACTION_STATEMENTS = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE SAVEPOINT')
+
+
+def percentile(timings, share):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+def count_queries(captured):
+    return sum(
+        not query['sql'].upper().startswith(TRANSACTION_STATEMENTS)
+        for query in captured.captured_queries
+    )
+
+
+def measure(name, request, repeat):
+    """Замеряет первый (холодный) вызов и repeat последующих"""
+    cache.clear()
+    with CaptureQueriesContext(connection) as cold_queries:
+        started_at = time.perf_counter()
+        response = request()
+        cold_seconds = time.perf_counter() - started_at
+    if response.status_code >= 400:
+        raise RuntimeError(f"{name}: ответ {response.status_code}")
+
+    timings = []
+    queries = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started_at = time.perf_counter()
+            request()
+            timings.append(time.perf_counter() - started_at)
+        queries.append(count_queries(captured))
+
+    return {
+        'cold_ms': cold_seconds * 1000,
+        'cold_queries': count_queries(cold_queries),
+        'min_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'queries': max(queries),
+        'query_budget': QUERY_BUDGETS[name],
+    }
+
+
+def run_benchmarks(repeat):
+    client = Client()
+    manager_client = Client()
+    manager = User.objects.create_superuser('bench', 'bench@example.com', 'bench')
+    manager_client.force_login(manager)
+
+    cart = list(Product.objects.values_list('id', flat=True)[:3])
+    order_payload = {
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79291000000',
+        'address': 'Москва, ул. Тверская, д. 1',
+        'products': [{'product': product_id, 'quantity': 2} for product_id in cart],
+    }
+
+    requests = {
+        'product_list_api': lambda: client.get('/api/products/'),
+        'register_order': lambda: client.post(
+            '/api/order/', order_payload, content_type='application/json'
+        ),
+        'view_orders': lambda: manager_client.get('/manager/orders/'),
+        'view_products': lambda: manager_client.get('/manager/products/'),
+    }
+    return {
+        name: measure(name, request, repeat)
+        for name, request in requests.items()
+    }
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding='utf-8') as file:
+        baseline = json.load(file)['results']
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['median_ms']
+        change = (result['median_ms'] - before) / before if before else 0
+        print(
+            f"  {name:<20} {before:8.2f} → {result['median_ms']:8.2f} мс ({change:+.0%}), "
+            f"запросов {baseline[name]['queries']} → {result['queries']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--restaurants', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Куда записать результаты в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args()
+
+    setup_test_environment()
+    runner = DiscoverRunner(verbosity=0)
+    old_config = runner.setup_databases()
+    try:
+        call_command(
+            'generate_bench_data',
+            products=args.products,
+            restaurants=args.restaurants,
+            orders=args.orders,
+            seed=args.seed,
+            stdout=io.StringIO(),
+        )
+        results = run_benchmarks(args.repeat)
+    finally:
+        runner.teardown_databases(old_config)
+
+    for name, result in results.items():
+        print(
+            f"{name:<20} медиана {result['median_ms']:8.2f} мс  p95 {result['p95_ms']:8.2f} мс  "
+            f"холодный {result['cold_ms']:8.2f} мс  запросов {result['queries']} "
+            f"(холодный {result['cold_queries']}, бюджет {result['query_budget']})"
+        )
+
+    report = {
+        'params': vars(args),
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.compare:
+        print(f"Сравнение с {args.compare}:")
+        compare(results, args.compare)
+
+    over_budget = [
+        name for name, result in results.items()
+        if result['queries'] > result['query_budget']
+    ]
+    if over_budget:
+        sys.exit(f"Превышен бюджет SQL-запросов: {', '.join(over_budget)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""Память и пропускная способность разных настроек gunicorn.
+
+По очереди запускает gunicorn с gunicorn.conf.py в нескольких
+конфигурациях, гоняет на каждой load_test.py и замеряет память всех
+процессов сервера. PSS делит общие страницы между процессами, поэтому
+выигрыш от preload_app виден именно в нем, а не в RSS. Нужна база,
+заполненная generate_bench_data, настройки берутся из .env как обычно.
+Запуск из корня проекта на Linux:
+
+    python manage.py generate_bench_data
+    python benchmarks/bench_workers.py --workers 4 --duration 30 --output workers.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGURATIONS = {
+    'wsgi-sync': {'SERVER_MODE': 'wsgi', 'GUNICORN_THREADS': '1', 'GUNICORN_PRELOAD': 'false'},
+    'wsgi-sync-preload': {'SERVER_MODE': 'wsgi', 'GUNICORN_THREADS': '1', 'GUNICORN_PRELOAD': 'true'},
+    'wsgi-gthread-preload': {'SERVER_MODE': 'wsgi', 'GUNICORN_THREADS': '4', 'GUNICORN_PRELOAD': 'true'},
+    'asgi-preload': {'SERVER_MODE': 'asgi', 'GUNICORN_PRELOAD': 'true'},
+}
+
+
+def process_tree(pid):
+    """Возвращает pid процесса и всех его потомков"""
+    children = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                parent = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    tree, queue = [], [pid]
+    while queue:
+        current = queue.pop()
+        tree.append(current)
+        queue.extend(children.get(current, []))
+    return tree
+
+
+def memory_usage(pid):
+    """Суммарные RSS и PSS процессов сервера в мегабайтах"""
+    totals = {'Rss': 0, 'Pss': 0}
+    for tree_pid in process_tree(pid):
+        try:
+            with open(f'/proc/{tree_pid}/smaps_rollup') as file:
+                for line in file:
+                    name, _, value = line.partition(':')
+                    if name in totals:
+                        totals[name] += int(value.split()[0])
+        except OSError:
+            continue
+    return {'rss_mb': totals['Rss'] / 1024, 'pss_mb': totals['Pss'] / 1024}
+
+
+def wait_until_ready(server, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'gunicorn завершился с кодом {server.returncode}')
+        try:
+            if requests.get(f'{url}/api/products/', timeout=5).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f'Сервер {url} не ответил за {timeout} с')
+
+
+def run_configuration(name, overrides, args):
+    url = f'http://127.0.0.1:{args.port}'
+    env = {
+        **os.environ,
+        **overrides,
+        # Воркерам нужен общий кэш, locmem gunicorn с несколькими воркерами не примет
+        'CACHE_URL': os.environ.get('CACHE_URL') or f'file://{tempfile.gettempdir()}/star_burger_bench_cache',
+        'WEB_CONCURRENCY': str(args.workers),
+        'GUNICORN_BIND': f'127.0.0.1:{args.port}',
+    }
+    server = subprocess.Popen(
+        ['gunicorn', '--config', 'gunicorn.conf.py'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        started_at = time.monotonic()
+        wait_until_ready(server, url)
+        startup_seconds = time.monotonic() - started_at
+        idle_memory = memory_usage(server.pid)
+
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            subprocess.run([
+                sys.executable, os.path.join(ROOT, 'benchmarks', 'load_test.py'),
+                '--url', url,
+                '--concurrency', str(args.concurrency),
+                '--duration', str(args.duration),
+                '--output', output.name,
+            ], check=True, stdout=subprocess.DEVNULL)
+            load = json.load(output)
+        loaded_memory = memory_usage(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    results = load['results'].values()
+    requests_total = sum(result['requests'] for result in results)
+    return {
+        'startup_seconds': startup_seconds,
+        'idle': idle_memory,
+        'loaded': loaded_memory,
+        'rps': requests_total / load['duration'],
+        'errors': sum(result['errors'] for result in results),
+        'p95_ms': max(result['p95_ms'] for result in results),
+        'scenarios': load['results'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30, help='Секунд нагрузки на конфигурацию')
+    parser.add_argument('--port', type=int, default=8050)
+    parser.add_argument(
+        '--only', nargs='+', choices=list(CONFIGURATIONS),
+        help='Какие конфигурации сравнить, по умолчанию все',
+    )
+    parser.add_argument('--output', help='Куда записать результаты в JSON')
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.only or CONFIGURATIONS:
+        result = results[name] = run_configuration(name, CONFIGURATIONS[name], args)
+        print(
+            f"{name:<22} {result['rps']:7.1f} запр/с  p95 {result['p95_ms']:8.2f} мс  "
+            f"ошибок {result['errors']}  старт {result['startup_seconds']:5.1f} с  "
+            f"PSS {result['idle']['pss_mb']:6.0f} → {result['loaded']['pss_mb']:6.0f} МБ  "
+            f"RSS {result['loaded']['rss_mb']:6.0f} МБ"
+        )
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'params': vars(args), 'results': results}, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""Нагрузочный тест работающего сервера несколькими параллельными клиентами.
+
+Каждый поток в цикле выбирает сценарий по весам: чтение каталога,
+оформление заказа или, если переданы логин и пароль менеджера, открытие
+страниц заказов и меню. По итогам печатаются RPS и перцентили задержек,
+а с --output результаты пишутся в JSON для сравнения прогонов. Пример
+против локального gunicorn с данными из generate_bench_data:
+
+    python manage.py generate_bench_data
+    gunicorn star_burger.wsgi:application --workers 4 --bind 127.0.0.1:8000
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 16 \\
+        --duration 60 --username admin --password admin --output load.json
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+
+SCENARIO_WEIGHTS = {
+    'product_list_api': 70,
+    'register_order': 20,
+    'view_orders': 5,
+    'view_products': 5,
+}
+MANAGER_SCENARIOS = {'view_orders', 'view_products'}
+CSRF_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, scenario, elapsed, ok):
+        with self.lock:
+            self.timings[scenario].append(elapsed)
+            if not ok:
+                self.errors[scenario] += 1
+
+    def summary(self, duration):
+        results = {}
+        for scenario, timings in sorted(self.timings.items()):
+            ordered = sorted(timings)
+            results[scenario] = {
+                'requests': len(ordered),
+                'errors': self.errors[scenario],
+                'rps': len(ordered) / duration,
+                'median_ms': statistics.median(ordered) * 1000,
+                'p95_ms': ordered[int(len(ordered) * 0.95)] * 1000,
+                'p99_ms': ordered[int(len(ordered) * 0.99)] * 1000,
+                'max_ms': ordered[-1] * 1000,
+            }
+        return results
+
+
+def login(session, url, username, password):
+    login_url = f"{url}/manager/login/"
+    page = session.get(login_url)
+    page.raise_for_status()
+    response = session.post(login_url, data={
+        'username': username,
+        'password': password,
+        'csrfmiddlewaretoken': CSRF_RE.search(page.text).group(1),
+    }, headers={'Referer': login_url})
+    if 'sessionid' not in session.cookies:
+        raise SystemExit(f"Не удалось войти как {username}: ответ {response.status_code}")
+
+
+def make_order_payload(rng, product_ids):
+    cart = rng.sample(product_ids, min(len(product_ids), rng.randint(1, 5)))
+    return {
+        'firstname': 'Нагрузка',
+        'lastname': 'Тестовая',
+        'phonenumber': f"+7929{rng.randint(0, 9999999):07d}",
+        'address': f"Москва, ул. Тверская, д. {rng.randint(1, 150)}",
+        'products': [
+            {'product': product_id, 'quantity': rng.randint(1, 3)}
+            for product_id in cart
+        ],
+    }
+
+
+def run_client(args, manager_session, scenarios, weights, product_ids, stats, deadline, seed):
+    rng = random.Random(seed)
+    # Покупатели приходят без сессии: с ней DRF потребовал бы CSRF-токен
+    session = requests.Session()
+
+    requests_by_scenario = {
+        'product_list_api': lambda: session.get(f"{args.url}/api/products/"),
+        'register_order': lambda: session.post(
+            f"{args.url}/api/order/", json=make_order_payload(rng, product_ids)
+        ),
+        'view_orders': lambda: manager_session.get(f"{args.url}/manager/orders/"),
+        'view_products': lambda: manager_session.get(f"{args.url}/manager/products/"),
+    }
+    while time.monotonic() < deadline:
+        scenario = rng.choices(scenarios, weights=weights)[0]
+        started_at = time.perf_counter()
+        try:
+            response = requests_by_scenario[scenario]()
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        stats.record(scenario, time.perf_counter() - started_at, ok)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help='Секунд нагрузки')
+    parser.add_argument('--username', help='Менеджер для страниц /manager/')
+    parser.add_argument('--password')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='Куда записать результаты в JSON')
+    args = parser.parse_args()
+    args.url = args.url.rstrip('/')
+
+    scenarios = [
+        scenario for scenario in SCENARIO_WEIGHTS
+        if args.username or scenario not in MANAGER_SCENARIOS
+    ]
+    weights = [SCENARIO_WEIGHTS[scenario] for scenario in scenarios]
+    catalog = requests.get(f"{args.url}/api/products/")
+    catalog.raise_for_status()
+    product_ids = [product['id'] for product in catalog.json()]
+    if not product_ids:
+        raise SystemExit('Каталог пуст, заполните базу командой generate_bench_data')
+
+    manager_sessions = []
+    for _ in range(args.concurrency):
+        manager_session = requests.Session()
+        if args.username:
+            login(manager_session, args.url, args.username, args.password)
+        manager_sessions.append(manager_session)
+
+    stats = Stats()
+    started_at = time.monotonic()
+    deadline = started_at + args.duration
+    threads = [
+        threading.Thread(
+            target=run_client,
+            args=(
+                args, manager_session, scenarios, weights, product_ids,
+                stats, deadline, args.seed + number,
+            ),
+        )
+        for number, manager_session in enumerate(manager_sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.monotonic() - started_at
+
+    results = stats.summary(duration)
+    for scenario, result in results.items():
+        print(
+            f"{scenario:<20} {result['rps']:7.1f} запр/с  медиана {result['median_ms']:8.2f} мс  "
+            f"p95 {result['p95_ms']:8.2f} мс  p99 {result['p99_ms']:8.2f} мс  "
+            f"ошибок {result['errors']}"
+        )
+
+    if args.output:
+        report = {
+            'params': {key: value for key, value in vars(args).items() if key != 'password'},
+            'duration': duration,
+            'results': results,
+        }
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
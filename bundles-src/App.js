@@ -13,6 +13,14 @@ import NoResults from "./components/NoResults";
 
 import './css/App.css';
 
+function generateIdempotencyKey(){
+  if (window.crypto && window.crypto.randomUUID){
+    return window.crypto.randomUUID();
+  }
+  // randomUUID доступен только по HTTPS
+  return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2) + Math.random().toString(36).slice(2);
+}
+
 class App extends Component {
 
   constructor(props){
@@ -26,6 +34,9 @@ class App extends Component {
       showCart: false,
       checkoutModalActive: false,
     };
+    // Повторная отправка того же заказа идет с тем же ключом идемпотентности,
+    // чтобы двойное нажатие или повтор на медленной сети не создали дубль
+    this.checkoutAttempt = null;
     this.handleSearch = this.handleSearch.bind(this);
     this.handleAddToCart = this.handleAddToCart.bind(this);
     this.checkProduct = this.checkProduct.bind(this);
@@ -61,6 +72,10 @@ class App extends Component {
     };
 
     let csrfToken = document.querySelector("[name=csrfmiddlewaretoken]").value;
+    let body = JSON.stringify(data);
+    if (!this.checkoutAttempt || this.checkoutAttempt.body !== body){
+      this.checkoutAttempt = {body, key: generateIdempotencyKey()};
+    }
 
     try {
       let response = await fetch(url, {
@@ -69,16 +84,22 @@ class App extends Component {
           'Accept': 'application/json',
           'Content-Type': 'application/json',
           'X-CSRFToken': csrfToken,
+          'Idempotency-Key': this.checkoutAttempt.key,
         },
-        body: JSON.stringify(data),
+        body,
       });
 
+      if (response.status === 409){
+        // Тот же заказ уже отправлен и обрабатывается, результат покажет первый запрос
+        return;
+      }
       if (!response.ok){
         alert('Ошибка при оформлении заказа. Попробуйте ещё раз или свяжитесь с нами по телефону.');
         return;
       }
       let responseData = await response.json();
 
+      this.checkoutAttempt = null;
       this.setState({
         cart: [],
       });
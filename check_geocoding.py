@@ -7,6 +7,7 @@ django.setup()
 from locations.utils import get_or_create_location, batch_update_locations
 from foodcartapp.models import Order, Restaurant
 from locations.models import Location
+from locations.lookup import coordinates_for
 
 print("=== ПРОВЕРКА СИСТЕМЫ ГЕОКОДИРОВАНИЯ ===\n")
 
@@ -35,7 +36,9 @@ for loc in Location.objects.all()[:5]:
 
 # 5. Проверим заказы
 print("\n5. Проверка заказов:")
-for order in Order.objects.all()[:3]:
+orders = Order.objects.all()[:3]
+coordinates_for(order.address for order in orders)
+for order in orders:
     print(f"Заказ {order.id}: {order.address}")
     print(f"  Координаты: {order.get_coordinates()}")
     print(f"  Адрес найден: {order.is_address_found()}")
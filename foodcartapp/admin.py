@@ -6,10 +6,12 @@ from django.core.exceptions import ValidationError
 from django.http import HttpResponseRedirect
 from django.utils.http import url_has_allowed_host_and_scheme
 
-from .models import Product, Order, OrderItem
+from .models import Product, Order, OrderIntake, OrderItem
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
+from .matching import get_capable_restaurant_ids
+from .proximity import nearest_capable_restaurants
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -107,13 +109,37 @@ class OrderItemInline(admin.TabularInline):
     extra = 0
 
 
+class OrderTotalFilter(admin.SimpleListFilter):
+    title = 'сумма заказа'
+    parameter_name = 'total'
+    RANGES = {
+        'lt500': ('до 500 ₽', None, 500),
+        '500-1000': ('500–1000 ₽', 500, 1000),
+        '1000-3000': ('1000–3000 ₽', 1000, 3000),
+        'gte3000': ('от 3000 ₽', 3000, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(value, label) for value, (label, _, _) in self.RANGES.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.RANGES:
+            return queryset
+        _, low, high = self.RANGES[self.value()]
+        if low is not None:
+            queryset = queryset.filter(total__gte=low)
+        if high is not None:
+            queryset = queryset.filter(total__lt=high)
+        return queryset
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = [
         'id', 'firstname', 'lastname', 'phonenumber',
-        'address', 'status', 'payment_method', 'created_at', 'delivered_at'
+        'address', 'status', 'payment_method', 'total', 'created_at', 'delivered_at'
     ]
-    list_filter = ['status', 'payment_method', 'created_at', 'delivered_at' ]
+    list_filter = ['status', 'payment_method', OrderTotalFilter, 'created_at', 'delivered_at']
     search_fields = ['firstname', 'lastname', 'phonenumber', 'address']
     inlines = [OrderItemInline]
     fieldsets = (
@@ -125,11 +151,12 @@ class OrderAdmin(admin.ModelAdmin):
         ('Ресторан', {
             'fields': [
                 'cooking_restaurant',
+                'get_capable_restaurants',
             ]
         }),
         ('Статус и оплата', {
             'fields': [
-                'status', 'payment_method', 'created_at', 'called_at', 'delivered_at'
+                'status', 'payment_method', 'total', 'created_at', 'called_at', 'delivered_at'
             ]
         }),
         ('Комментарии', {
@@ -141,7 +168,22 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
-    readonly_fields = ['created_at']
+    readonly_fields = ['created_at', 'total', 'get_capable_restaurants']
+
+    def get_capable_restaurants(self, obj):
+        if not obj.id:
+            return '-'
+        nearest = nearest_capable_restaurants(obj, k=5)
+        if nearest:
+            return ', '.join(
+                f'{restaurant.name} ({distance:.2f} км)' for restaurant, distance in nearest
+            )
+        product_ids = set(obj.items.values_list('product_id', flat=True))
+        restaurants = Restaurant.objects.filter(
+            id__in=get_capable_restaurant_ids(product_ids)
+        ).order_by('name')
+        return ', '.join(restaurant.name for restaurant in restaurants) or 'нет подходящих ресторанов'
+    get_capable_restaurants.short_description = 'могут приготовить'
 
     def response_change(self, request, obj):
         """Переопределяем поведение после сохранения заказа"""
@@ -155,9 +197,16 @@ class OrderAdmin(admin.ModelAdmin):
                 return HttpResponseRedirect(next_url)
         return super().response_change(request, obj)
 
+    def save_model(self, request, obj, form, change):
+        if 'address' in form.changed_data:
+            obj.candidates_stale = True
+        super().save_model(request, obj, form, change)
+
     def save_formset(self, request, form, formset, change):
         """Валидация OrderItem при сохранении в админке"""
         instances = formset.save(commit=False)
+        for instance in formset.deleted_objects:
+            instance.delete()
         for instance in instances:
             if not instance.price or instance.price == 0:
                 instance.price = instance.product.price
@@ -166,3 +215,17 @@ class OrderAdmin(admin.ModelAdmin):
                 raise ValidationError('Цена не может быть отрицательной')
             instance.save()
         formset.save_m2m()
+
+        if formset.model is OrderItem:
+            form.instance.update_total()
+            if formset.has_changed():
+                Order.objects.filter(id=form.instance.id).update(candidates_stale=True)
+
+
+@admin.register(OrderIntake)
+class OrderIntakeAdmin(admin.ModelAdmin):
+    list_display = ['tracking_id', 'status', 'order', 'attempts', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['tracking_id']
+    raw_id_fields = ['order']
+    readonly_fields = ['tracking_id', 'created_at', 'updated_at', 'last_error']
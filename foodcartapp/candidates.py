@@ -0,0 +1,172 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from locations.distances import distance_matrix, distance_or_none
+from locations.models import Location
+
+from .matching import get_restaurant_matcher
+from .proximity import get_spatial_index
+from .models import Order, OrderCandidate, OrderItem, Product, Restaurant, RestaurantMenuItem
+
+
+OPEN_ORDER_STATUSES = ['new', 'processing']
+
+
+def open_orders():
+    """Заказы, для которых менеджеру еще нужно выбрать ресторан"""
+    return Order.objects.filter(
+        status__in=OPEN_ORDER_STATUSES,
+        cooking_restaurant__isnull=True,
+    )
+
+
+def load_coordinates(canonical_addresses):
+    return {
+        canonical_address: (latitude, longitude)
+        for canonical_address, latitude, longitude in Location.objects.filter(
+            canonical_address__in=canonical_addresses,
+            latitude__isnull=False,
+            longitude__isnull=False,
+        ).values_list('canonical_address', 'latitude', 'longitude')
+    }
+
+
+def refresh_order_candidates(order_ids):
+    """Пересчитывает рестораны-кандидаты и расстояния до них для заказов.
+
+    Для геокодированного заказа ORDER_CANDIDATES_LIMIT ближайших
+    подходящих ресторанов находятся по KD-дереву, поэтому пересчет не
+    растет линейно с числом ресторанов. Расстояния до найденных ресторанов
+    уточняются в режиме DISTANCE_PRECISION. Заказу без координат достаются
+    первые подходящие рестораны без расстояний.
+
+    Флаг candidates_stale снимается до расчета: если заказ снова пометят
+    устаревшим, пока идет пересчет, он попадет в следующую пачку.
+    """
+    order_ids = list(order_ids)
+    if not order_ids:
+        return 0
+    Order.objects.filter(id__in=order_ids).update(candidates_stale=False)
+
+    orders = list(open_orders().filter(id__in=order_ids).only('id', 'canonical_address'))
+    products_by_order = defaultdict(set)
+    for order_id, product_id in OrderItem.objects.filter(
+        order_id__in=[order.id for order in orders]
+    ).values_list('order_id', 'product_id'):
+        products_by_order[order_id].add(product_id)
+
+    order_coordinates = load_coordinates({order.canonical_address for order in orders})
+    limit = settings.ORDER_CANDIDATES_LIMIT
+    matcher = get_restaurant_matcher()
+    index = get_spatial_index()
+    nearest_by_order = {}
+    for order in orders:
+        mask = matcher.capable_mask(products_by_order[order.id])
+        coords = order_coordinates.get(order.canonical_address)
+        if not mask:
+            nearest_by_order[order.id] = []
+        elif coords is None:
+            nearest_by_order[order.id] = matcher.capable_restaurant_ids(products_by_order[order.id])[:limit]
+        else:
+            nearest_by_order[order.id] = [
+                restaurant_id for restaurant_id, _ in index.nearest(
+                    coords,
+                    k=limit,
+                    accept=lambda restaurant_id: matcher.is_capable(mask, restaurant_id),
+                )
+            ]
+
+    restaurant_addresses = dict(Restaurant.objects.filter(
+        id__in={restaurant_id for nearest in nearest_by_order.values() for restaurant_id in nearest}
+    ).values_list('id', 'canonical_address'))
+    restaurant_coordinates = load_coordinates(set(restaurant_addresses.values()))
+
+    candidates = []
+    for order in orders:
+        restaurant_ids = [
+            restaurant_id for restaurant_id in nearest_by_order[order.id]
+            if restaurant_id in restaurant_addresses
+        ]
+        distances = distance_matrix(
+            [order_coordinates.get(order.canonical_address)],
+            [restaurant_coordinates.get(restaurant_addresses[restaurant_id]) for restaurant_id in restaurant_ids],
+            mode=settings.DISTANCE_PRECISION,
+        )
+        order_candidates = [
+            (distance_or_none(distances[0, column]), restaurant_id)
+            for column, restaurant_id in enumerate(restaurant_ids)
+        ]
+        order_candidates.sort(key=lambda item: (item[0] is None, item[0] or 0))
+        candidates.extend(
+            OrderCandidate(
+                order_id=order.id,
+                restaurant_id=restaurant_id,
+                distance_km=distance,
+                rank=rank,
+            )
+            for rank, (distance, restaurant_id) in enumerate(order_candidates, start=1)
+        )
+
+    with transaction.atomic():
+        OrderCandidate.objects.filter(order_id__in=order_ids).delete()
+        OrderCandidate.objects.bulk_create(candidates)
+    return len(order_ids)
+
+
+def refresh_stale_candidates(batch_size=200):
+    """Пересчитывает одну пачку заказов, помеченных устаревшими"""
+    order_ids = list(
+        Order.objects.filter(candidates_stale=True)
+        .order_by('created_at')
+        .values_list('id', flat=True)[:batch_size]
+    )
+    return refresh_order_candidates(order_ids)
+
+
+def mark_candidates_stale(orders):
+    """Помечает кандидатов заказов устаревшими одним UPDATE"""
+    return orders.filter(candidates_stale=False).update(candidates_stale=True)
+
+
+def mark_stale_for_products(product_ids):
+    """Меню ресторанов изменилось: затронуты открытые заказы с этими товарами"""
+    return mark_candidates_stale(Order.objects.filter(
+        id__in=open_orders().filter(items__product_id__in=product_ids).values('id')
+    ))
+
+
+def orders_capable_at(restaurant_id):
+    """Открытые заказы, которые ресторан может приготовить целиком"""
+    unavailable_products = Product.objects.exclude(
+        id__in=RestaurantMenuItem.objects.filter(
+            restaurant_id=restaurant_id,
+            availability=True,
+        ).values('product_id')
+    )
+    return open_orders().filter(items__isnull=False).exclude(items__product__in=unavailable_products)
+
+
+def mark_stale_for_restaurants(restaurant_ids):
+    """Адрес ресторана изменился: затронуты заказы, где он кандидат, и все
+    заказы, которые он может приготовить, — он мог попасть в их ближайшие"""
+    affected = Q(id__in=OrderCandidate.objects.filter(
+        restaurant_id__in=restaurant_ids
+    ).values('order_id'))
+    for restaurant_id in restaurant_ids:
+        affected |= Q(id__in=orders_capable_at(restaurant_id).values('id'))
+    return mark_candidates_stale(Order.objects.filter(affected))
+
+
+def mark_stale_for_addresses(canonical_addresses):
+    """Адреса геокодированы: затронуты заказы с этими адресами и рестораны на них"""
+    if not canonical_addresses:
+        return 0
+    return (
+        mark_candidates_stale(open_orders().filter(canonical_address__in=canonical_addresses))
+        + mark_stale_for_restaurants(list(
+            Restaurant.objects.filter(canonical_address__in=canonical_addresses).values_list('id', flat=True)
+        ))
+    )
@@ -0,0 +1,65 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Product
+from .versioning import bump_cache_version, get_cache_version
+
+
+CATALOG_VERSION_KEY = 'foodcartapp:catalog:version'
+CATALOG_PAYLOAD_KEY = 'foodcartapp:catalog:payload:{version}'
+CATALOG_PAYLOAD_TIMEOUT = 24 * 60 * 60
+
+
+def get_catalog_version():
+    return get_cache_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """Сбрасывает кэш каталога, выставляя новую версию"""
+    bump_cache_version(CATALOG_VERSION_KEY)
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': product.price,
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
+        }
+    }
+
+
+def build_catalog_payload():
+    """Собирает каталог из БД и кодирует его в компактный JSON"""
+    products = Product.objects.select_related('category').available()
+    dumped_products = [serialize_product(product) for product in products]
+    body = json.dumps(
+        dumped_products,
+        cls=DjangoJSONEncoder,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode('utf-8')
+    etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+    return body, etag
+
+
+def get_catalog_payload():
+    """Возвращает закодированный каталог и его ETag для текущей версии"""
+    key = CATALOG_PAYLOAD_KEY.format(version=get_catalog_version())
+    payload = cache.get(key)
+    if payload is None:
+        payload = build_catalog_payload()
+        cache.set(key, payload, timeout=CATALOG_PAYLOAD_TIMEOUT)
+    return payload
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import OrderEvent
+
+
+ORDER_EVENTS_BATCH = 100
+ORDER_EVENTS_MAX_AGE = timedelta(days=1)
+SSE_RETRY_MS = 2000
+
+
+def record_order_events(order_ids, kind):
+    """Записывает в журнал события заказов одним INSERT"""
+    OrderEvent.objects.bulk_create([
+        OrderEvent(order_id=order_id, kind=kind) for order_id in order_ids
+    ])
+
+
+def get_latest_event_id():
+    return OrderEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def prune_order_events(max_age=ORDER_EVENTS_MAX_AGE):
+    """Удаляет старые события: ленте нужны только свежие"""
+    deleted, _ = OrderEvent.objects.filter(
+        created_at__lt=timezone.now() - max_age
+    ).delete()
+    return deleted
+
+
+def format_sse(event_id, data, event='order'):
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"id: {event_id}\nevent: {event}\ndata: {payload}\n\n"
+
+
+async def fetch_order_events(after_id):
+    """Читает из журнала пачку событий после after_id"""
+    return [
+        event async for event in OrderEvent.objects
+        .filter(id__gt=after_id)
+        .order_by('id')
+        .values('id', 'order_id', 'kind')[:ORDER_EVENTS_BATCH]
+    ]
+
+
+def format_order_events(events):
+    return ''.join(
+        format_sse(event['id'], {'order_id': event['order_id'], 'kind': event['kind']})
+        for event in events
+    )
+
+
+async def poll_order_events(after_id):
+    """Отдает одним ответом события, накопившиеся после after_id.
+
+    Ответ не ждет новых событий, поэтому не держит синхронный воркер:
+    браузер переподключится через SSE_RETRY_MS и спросит снова.
+    """
+    events = await fetch_order_events(after_id)
+    return f"retry: {SSE_RETRY_MS}\n\n" + format_order_events(events)
+
+
+async def stream_order_events(after_id):
+    """Отдает события журнала после after_id в формате server-sent events.
+
+    Журнал опрашивается раз в ORDER_FEED_POLL_INTERVAL секунд одним
+    легким запросом по первичному ключу. Через ORDER_FEED_TIMEOUT секунд
+    поток закрывается, и браузер переподключается с заголовком
+    Last-Event-ID, поэтому соединение не висит вечно на одном воркере.
+    Нужен ASGI-сервер: WSGI отдает асинхронный поток только целиком.
+    """
+    deadline = time.monotonic() + settings.ORDER_FEED_TIMEOUT
+    yield f"retry: {SSE_RETRY_MS}\n\n"
+
+    while time.monotonic() < deadline:
+        events = await fetch_order_events(after_id)
+        if events:
+            after_id = events[-1]['id']
+            yield format_order_events(events)
+        if len(events) == ORDER_EVENTS_BATCH:
+            continue
+        if not events:
+            # Комментарий не дает прокси закрыть молчащее соединение
+            yield ": ping\n\n"
+        await asyncio.sleep(settings.ORDER_FEED_POLL_INTERVAL)
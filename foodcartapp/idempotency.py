@@ -0,0 +1,96 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_CACHE_KEY = 'foodcartapp:idempotency:{key}'
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+
+
+def fingerprint(body):
+    return hashlib.sha256(body).hexdigest()
+
+
+def expired_keys(now=None):
+    """Ключи, брошенные посреди обработки или хранящиеся дольше TTL"""
+    now = now or timezone.now()
+    return IdempotencyKey.objects.filter(
+        Q(response_status__isnull=True, created_at__lt=now - timedelta(seconds=IDEMPOTENCY_LOCK_TIMEOUT))
+        | Q(created_at__lt=now - timedelta(seconds=settings.ORDER_IDEMPOTENCY_TTL))
+    )
+
+
+def prune_idempotency_keys():
+    deleted, _ = expired_keys().delete()
+    return deleted
+
+
+class IdempotentRequest:
+    """Запрос с ключом идемпотентности и сохраненным результатом.
+
+    Ключ занимается строкой в таблице IdempotencyKey с уникальным
+    индексом, поэтому два одинаковых запроса, попавшие в разные воркеры,
+    не создадут два заказа. Незавершенная запись считается брошенной через
+    IDEMPOTENCY_LOCK_TIMEOUT секунд, готовый ответ хранится
+    ORDER_IDEMPOTENCY_TTL. Готовый ответ дополнительно кладется в кэш,
+    чтобы повторы обходились без запросов к БД. Вместе с ключом хранится
+    отпечаток тела запроса, чтобы тот же ключ с другим заказом не вернул
+    чужой ответ.
+    """
+
+    def __init__(self, scope, key, body):
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        self.key = f'{scope}:{digest}'
+        self.cache_key = IDEMPOTENCY_CACHE_KEY.format(key=self.key)
+        self.fingerprint = fingerprint(body)
+
+    def acquire(self):
+        """Занимает ключ. Возвращает None или запись, сохраненную раньше"""
+        entry = cache.get(self.cache_key)
+        if entry is not None:
+            return entry
+
+        expired_keys().filter(key=self.key).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(key=self.key, fingerprint=self.fingerprint)
+            return None
+        except IntegrityError:
+            pass
+
+        stored = IdempotencyKey.objects.filter(key=self.key).first()
+        if stored is None:
+            return self.acquire()
+        if stored.response_status is None:
+            return (IN_PROGRESS, stored.fingerprint)
+        return (DONE, stored.fingerprint, stored.response_status, stored.response_data)
+
+    def matches(self, entry):
+        return entry[1] == self.fingerprint
+
+    def save(self, status, data):
+        IdempotencyKey.objects.filter(key=self.key).update(
+            response_status=status,
+            response_data=data,
+        )
+        cache.set(
+            self.cache_key,
+            (DONE, self.fingerprint, status, data),
+            settings.ORDER_IDEMPOTENCY_TTL,
+        )
+
+    def release(self):
+        """Освобождает ключ, чтобы исправленный запрос можно было повторить"""
+        IdempotencyKey.objects.filter(key=self.key, response_status__isnull=True).delete()
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from locations.normalization import normalize_address
+from locations.utils import enqueue_geocoding
+
+from .events import record_order_events
+from .models import Order, OrderEvent, OrderIntake, OrderItem
+
+
+ORDER_INTAKE_MAX_ATTEMPTS = 3
+ORDER_INTAKE_LEASE = timedelta(minutes=5)
+
+ORDER_FIELDS = ['firstname', 'lastname', 'phonenumber', 'address']
+
+
+def enqueue_order(serializer):
+    """Сохраняет проверенный заказ в очередь и возвращает запись очереди.
+
+    Цены фиксируются в момент приема, чтобы заказ из очереди стоил
+    столько же, сколько видел покупатель.
+    """
+    data = serializer.validated_data
+    payload = {field: str(data[field]) for field in ORDER_FIELDS}
+    payload['items'] = [
+        {
+            'product': item['product']['id'],
+            'quantity': item['quantity'],
+            'price': str(serializer.products_by_id[item['product']['id']].price),
+        }
+        for item in data['items']
+    ]
+    return OrderIntake.objects.create(payload=payload)
+
+
+def build_order(payload):
+    """Собирает несохраненные заказ и его позиции из данных очереди"""
+    items = [
+        OrderItem(
+            product_id=item['product'],
+            quantity=item['quantity'],
+            price=Decimal(item['price']),
+        )
+        for item in payload['items']
+    ]
+    order = Order(
+        **{field: payload[field] for field in ORDER_FIELDS},
+        canonical_address=normalize_address(payload['address']),
+        total=sum(item.price * item.quantity for item in items),
+    )
+    return order, items
+
+
+def claim_order_intakes(limit):
+    """Забирает заказы из очереди, чтобы их не взял другой воркер"""
+    now = timezone.now()
+    with transaction.atomic():
+        intakes = list(
+            OrderIntake.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status__in=[OrderIntake.PENDING, OrderIntake.PROCESSING],
+                attempts__lt=ORDER_INTAKE_MAX_ATTEMPTS,
+            )
+            .exclude(
+                status=OrderIntake.PROCESSING,
+                updated_at__gte=now - ORDER_INTAKE_LEASE,
+            )
+            .order_by('created_at')[:limit]
+        )
+        OrderIntake.objects.filter(id__in=[intake.id for intake in intakes]).update(
+            status=OrderIntake.PROCESSING,
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+    for intake in intakes:
+        intake.attempts += 1
+    return intakes
+
+
+@transaction.atomic
+def save_intakes(intakes):
+    """Создает заказы пачки в одной транзакции: по запросу на каждую таблицу"""
+    orders = []
+    order_items = []
+    for intake in intakes:
+        order, items = build_order(intake.payload)
+        for item in items:
+            item.order = order
+        orders.append(order)
+        order_items.extend(items)
+
+    Order.objects.bulk_create(orders)
+    OrderItem.objects.bulk_create(order_items)
+    record_order_events([order.id for order in orders], OrderEvent.CREATED)
+
+    for intake, order in zip(intakes, orders):
+        intake.order = order
+        intake.status = OrderIntake.DONE
+        intake.last_error = ''
+        intake.updated_at = timezone.now()
+    OrderIntake.objects.bulk_update(intakes, ['order', 'status', 'last_error', 'updated_at'])
+    return orders
+
+
+def fail_intake(intake, error):
+    intake.last_error = str(error)
+    if intake.attempts >= ORDER_INTAKE_MAX_ATTEMPTS:
+        intake.status = OrderIntake.FAILED
+    else:
+        intake.status = OrderIntake.PENDING
+    intake.save(update_fields=['last_error', 'status', 'updated_at'])
+
+
+def process_order_intake(batch_size=100):
+    """Переносит одну пачку заказов из очереди в Order и OrderItem.
+
+    Если пачка не сохраняется целиком, например товар успели удалить,
+    заказы сохраняются по одному, а проблемные помечаются ошибкой.
+    """
+    intakes = claim_order_intakes(batch_size)
+    if not intakes:
+        return []
+
+    try:
+        orders = save_intakes(intakes)
+    except Exception:
+        orders = []
+        for intake in intakes:
+            try:
+                orders.extend(save_intakes([intake]))
+            except Exception as e:
+                fail_intake(intake, e)
+
+    enqueue_geocoding({order.address for order in orders}, requeue=True)
+    return intakes
@@ -0,0 +1,158 @@
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from foodcartapp.catalog import bump_catalog_version
+from foodcartapp.matching import bump_menu_version
+from foodcartapp.models import Order, OrderItem, Product, ProductCategory, Restaurant, \
+    RestaurantMenuItem
+from foodcartapp.proximity import bump_restaurants_geo_version
+from locations.models import Location
+from locations.normalization import normalize_address
+
+
+MOSCOW_BOUNDS = ((55.55, 55.95), (37.35, 37.85))
+
+CATEGORIES = ['Бургеры', 'Роллы', 'Пицца', 'Салаты', 'Супы', 'Напитки', 'Десерты', 'Закуски']
+STREETS = [
+    'ул. Тверская', 'ул. Арбат', 'Ленинский пр-т', 'Кутузовский пр-т', 'ул. Покровка',
+    'ул. Мясницкая', 'Пятницкая ул.', 'ул. Большая Ордынка', 'Садовая-Кудринская ул.',
+    'пр-т Мира', 'ул. Профсоюзная', 'Варшавское ш.', 'ул. Новый Арбат', 'Чистопрудный б-р',
+    'ул. Сретенка', 'Ленинградский пр-т', 'ул. Маросейка', 'ул. Остоженка',
+]
+FIRSTNAMES = ['Иван', 'Мария', 'Алексей', 'Ольга', 'Дмитрий', 'Анна', 'Сергей', 'Елена']
+LASTNAMES = ['Иванов', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов', 'Лебедева', 'Козлов']
+
+
+def random_address(rng):
+    return f"Москва, {rng.choice(STREETS)}, д. {rng.randint(1, 150)}"
+
+
+def random_coordinates(rng):
+    (min_lat, max_lat), (min_lon, max_lon) = MOSCOW_BOUNDS
+    return rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими товарами, ресторанами и заказами для нагрузочных тестов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--restaurants', type=int, default=200)
+        parser.add_argument('--orders', type=int, default=1000)
+        parser.add_argument(
+            '--menu-share',
+            type=float,
+            default=0.6,
+            help='Доля товаров в меню каждого ресторана',
+        )
+        parser.add_argument(
+            '--ungeocoded-share',
+            type=float,
+            default=0.05,
+            help='Доля адресов заказов без координат',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        categories = ProductCategory.objects.bulk_create([
+            ProductCategory(name=name) for name in CATEGORIES
+        ])
+        products = Product.objects.bulk_create([
+            Product(
+                name=f"{category.name} №{number}",
+                category=category,
+                price=Decimal(rng.randrange(90, 990, 10)),
+                image='burger.jpg',
+                special_status=rng.random() < 0.1,
+                description='Синтетический товар для нагрузочных тестов',
+            )
+            for number in range(1, options['products'] + 1)
+            for category in [rng.choice(categories)]
+        ])
+
+        restaurants = Restaurant.objects.bulk_create([
+            Restaurant(
+                name=f"Star Burger №{number}",
+                address=address,
+                canonical_address=normalize_address(address),
+                contact_phone='+74951234567',
+            )
+            for number, address in enumerate(
+                [random_address(rng) for _ in range(options['restaurants'])], start=1,
+            )
+        ])
+        menu_size = max(1, int(len(products) * options['menu_share']))
+        RestaurantMenuItem.objects.bulk_create(
+            [
+                RestaurantMenuItem(
+                    restaurant=restaurant,
+                    product=product,
+                    availability=rng.random() < 0.95,
+                )
+                for restaurant in restaurants
+                for product in rng.sample(products, menu_size)
+            ],
+            batch_size=5000,
+        )
+
+        # Популярные товары попадают в корзины чаще, как в реальных заказах
+        weights = [1 / rank for rank in range(1, len(products) + 1)]
+        orders = []
+        order_items = []
+        for _ in range(options['orders']):
+            cart = {}
+            for product in rng.choices(products, weights=weights, k=rng.randint(1, 5)):
+                cart[product] = cart.get(product, 0) + rng.randint(1, 3)
+            address = random_address(rng)
+            order = Order(
+                firstname=rng.choice(FIRSTNAMES),
+                lastname=rng.choice(LASTNAMES),
+                phonenumber=f"+7929{rng.randint(0, 9999999):07d}",
+                address=address,
+                canonical_address=normalize_address(address),
+                status=rng.choice(['new', 'new', 'new', 'processing']),
+                payment_method=rng.choice(['cash', 'electronic']),
+                total=sum(product.price * quantity for product, quantity in cart.items()),
+            )
+            orders.append(order)
+            order_items.extend(
+                OrderItem(order=order, product=product, quantity=quantity, price=product.price)
+                for product, quantity in cart.items()
+            )
+        Order.objects.bulk_create(orders, batch_size=2000)
+        OrderItem.objects.bulk_create(order_items, batch_size=5000)
+
+        addresses = {order.address for order in orders} | {r.address for r in restaurants}
+        known_addresses = set(Location.objects.filter(
+            canonical_address__in={normalize_address(address) for address in addresses}
+        ).values_list('canonical_address', flat=True))
+        locations = {}
+        for address in sorted(addresses):
+            canonical_address = normalize_address(address)
+            if canonical_address in known_addresses or canonical_address in locations:
+                continue
+            latitude, longitude = random_coordinates(rng)
+            if rng.random() < options['ungeocoded_share']:
+                latitude = longitude = None
+            locations[canonical_address] = Location(
+                address=address,
+                canonical_address=canonical_address,
+                latitude=latitude,
+                longitude=longitude,
+            )
+        Location.objects.bulk_create(locations.values(), batch_size=2000)
+
+        # bulk_create не отправляет сигналы, кэши сбрасываем сами
+        transaction.on_commit(bump_catalog_version)
+        transaction.on_commit(bump_menu_version)
+        transaction.on_commit(bump_restaurants_geo_version)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано товаров: {len(products)}, ресторанов: {len(restaurants)}, "
+            f"заказов: {len(orders)}, адресов: {len(locations)}"
+        ))
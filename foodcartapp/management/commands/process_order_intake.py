@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+from foodcartapp.intake import process_order_intake
+
+
+class Command(BaseCommand):
+    help = 'Переносит заказы из очереди приема в базу пачками'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Сколько заказов сохранять одной транзакцией',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь до конца и выйти',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            intakes = process_order_intake(options['batch_size'])
+            if intakes:
+                done = sum(intake.order_id is not None for intake in intakes)
+                self.stdout.write(f"Сохранено заказов: {done} из {len(intakes)}")
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,85 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+TARGETS = {
+    'settings': 'import django.conf; django.conf.settings.INSTALLED_APPS',
+    'setup': 'import django; django.setup()',
+    'wsgi': 'import star_burger.wsgi',
+    'asgi': 'import star_burger.asgi',
+}
+
+
+class Command(BaseCommand):
+    help = 'Замеряет холодный старт Django и показывает, какие импорты его замедляют'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            choices=list(TARGETS),
+            default='wsgi',
+            help='Что запускать в чистом интерпретаторе: настройки, django.setup или приложение',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Сколько раз замерить время старта',
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Сколько самых медленных пакетов показать',
+        )
+
+    def run_target(self, code, importtime=False):
+        command = [sys.executable]
+        if importtime:
+            command += ['-X', 'importtime']
+        command += ['-c', code]
+        started_at = time.perf_counter()
+        process = subprocess.run(
+            command,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ['DJANGO_SETTINGS_MODULE']},
+            capture_output=True,
+            text=True,
+        )
+        elapsed = time.perf_counter() - started_at
+        if process.returncode:
+            error_lines = process.stderr.strip().splitlines()
+            raise CommandError(
+                error_lines[-1] if error_lines else f'Процесс завершился с кодом {process.returncode}'
+            )
+        return elapsed, process.stderr
+
+    def handle(self, *args, **options):
+        code = TARGETS[options['target']]
+
+        self.run_target(code)
+        timings = [self.run_target(code)[0] for _ in range(options['repeat'])]
+        baseline = [self.run_target('pass')[0] for _ in range(options['repeat'])]
+
+        _, report = self.run_target(code, importtime=True)
+        self_time_by_package = defaultdict(int)
+        for line in report.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            self_us, _, module = line[len('import time:'):].split('|')
+            self_time_by_package[module.strip().split('.')[0]] += int(self_us)
+
+        self.stdout.write(
+            f"{options['target']}: медиана {statistics.median(timings) * 1000:.0f} мс, "
+            f"из них запуск интерпретатора {statistics.median(baseline) * 1000:.0f} мс"
+        )
+        self.stdout.write(f"Импорты: {sum(self_time_by_package.values()) / 1000:.0f} мс")
+        slowest = sorted(self_time_by_package.items(), key=lambda item: item[1], reverse=True)
+        for package, self_us in slowest[:options['top']]:
+            self.stdout.write(f"  {package:<30} {self_us / 1000:8.1f} мс")
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from foodcartapp.idempotency import prune_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Удаляет ключи идемпотентности старше ORDER_IDEMPOTENCY_TTL'
+
+    def handle(self, *args, **options):
+        deleted = prune_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(f'Удалено ключей: {deleted}'))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from foodcartapp.events import ORDER_EVENTS_MAX_AGE, prune_order_events
+
+
+class Command(BaseCommand):
+    help = 'Удаляет старые события из журнала ленты заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=float,
+            default=ORDER_EVENTS_MAX_AGE.total_seconds() / 3600,
+            help='Сколько часов хранить события',
+        )
+
+    def handle(self, *args, **options):
+        deleted = prune_order_events(timedelta(hours=options['hours']))
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий: {deleted}'))
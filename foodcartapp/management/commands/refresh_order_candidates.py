@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from foodcartapp.candidates import open_orders, refresh_order_candidates, refresh_stale_candidates
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рестораны-кандидаты для заказов, помеченных устаревшими'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Сколько заказов пересчитывать за раз',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Пауза в секундах, когда пересчитывать нечего',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Пересчитать все устаревшие заказы и выйти',
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать все открытые заказы, а не только устаревшие, и выйти',
+        )
+
+    def handle(self, *args, **options):
+        if options['all']:
+            order_ids = list(open_orders().values_list('id', flat=True))
+            for start in range(0, len(order_ids), options['batch_size']):
+                refresh_order_candidates(order_ids[start:start + options['batch_size']])
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано заказов: {len(order_ids)}'))
+            return
+
+        while True:
+            refreshed = refresh_stale_candidates(options['batch_size'])
+            if refreshed:
+                self.stdout.write(f'Пересчитано заказов: {refreshed}')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает сохраненные суммы заказов и сверяет их с позициями'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить суммы, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            updated = Order.objects.refresh_totals()
+            self.stdout.write(f"Пересчитаны суммы {updated} заказов")
+
+        stale_orders = Order.objects.with_stale_total().order_by('id')
+        for order in stale_orders[:20]:
+            self.stdout.write(
+                f"Заказ #{order.id}: сохранено {order.total}, по позициям {order.calculated_total}"
+            )
+
+        stale_count = stale_orders.count()
+        if stale_count:
+            raise CommandError(f"Суммы не совпадают у {stale_count} заказов")
+
+        self.stdout.write(self.style.SUCCESS('Суммы всех заказов совпадают с позициями'))
@@ -0,0 +1,109 @@
+from django.core.cache import cache
+
+from .models import RestaurantMenuItem
+from .versioning import bump_cache_version, get_cache_version
+
+
+MENU_VERSION_KEY = 'foodcartapp:menu:version'
+MATCHER_KEY = 'foodcartapp:menu:matcher:{version}'
+MATCHER_TIMEOUT = 24 * 60 * 60
+
+_local_matcher = None
+
+
+class RestaurantMatcher:
+    """Инвертированный индекс «товар → битовая маска ресторанов».
+
+    Бит i маски выставлен, если ресторан restaurant_ids[i] сейчас готовит
+    товар. Рестораны, способные приготовить весь заказ, получаются
+    пересечением масок всех его товаров.
+    """
+
+    def __init__(self, version, restaurant_ids, product_masks):
+        self.version = version
+        self.restaurant_ids = restaurant_ids
+        self.restaurant_bits = {
+            restaurant_id: 1 << position
+            for position, restaurant_id in enumerate(restaurant_ids)
+        }
+        self.product_masks = product_masks
+
+    @classmethod
+    def build(cls, version):
+        menu_items = (
+            RestaurantMenuItem.objects
+            .filter(availability=True)
+            .order_by('restaurant_id')
+            .values_list('product_id', 'restaurant_id')
+        )
+
+        restaurant_ids = []
+        restaurant_bits = {}
+        product_masks = {}
+        for product_id, restaurant_id in menu_items:
+            if restaurant_id not in restaurant_bits:
+                restaurant_bits[restaurant_id] = 1 << len(restaurant_ids)
+                restaurant_ids.append(restaurant_id)
+            product_masks[product_id] = (
+                product_masks.get(product_id, 0) | restaurant_bits[restaurant_id]
+            )
+        return cls(version, restaurant_ids, product_masks)
+
+    def capable_mask(self, product_ids):
+        mask = None
+        for product_id in product_ids:
+            product_mask = self.product_masks.get(product_id, 0)
+            mask = product_mask if mask is None else mask & product_mask
+            if not mask:
+                return 0
+        return mask or 0
+
+    def is_capable(self, mask, restaurant_id):
+        """Проверяет, входит ли ресторан в маску, полученную из capable_mask"""
+        return bool(mask & self.restaurant_bits.get(restaurant_id, 0))
+
+    def restaurant_availability(self, product_id, restaurant_ids):
+        """Возвращает доступность товара в ресторанах в порядке restaurant_ids"""
+        mask = self.product_masks.get(product_id, 0)
+        return [self.is_capable(mask, restaurant_id) for restaurant_id in restaurant_ids]
+
+    def capable_restaurant_ids(self, product_ids):
+        """Возвращает id ресторанов, которые могут приготовить все товары"""
+        mask = self.capable_mask(product_ids)
+        restaurant_ids = []
+        while mask:
+            lowest_bit = mask & -mask
+            restaurant_ids.append(self.restaurant_ids[lowest_bit.bit_length() - 1])
+            mask ^= lowest_bit
+        return restaurant_ids
+
+
+def get_restaurant_matcher():
+    """Возвращает индекс для текущей версии меню ресторанов.
+
+    Индекс строится одним запросом, хранится в общем кэше и дополнительно
+    в памяти процесса, так что обычно обращение стоит одного чтения версии.
+    """
+    global _local_matcher
+
+    version = get_cache_version(MENU_VERSION_KEY)
+    if _local_matcher is not None and _local_matcher.version == version:
+        return _local_matcher
+
+    key = MATCHER_KEY.format(version=version)
+    matcher = cache.get(key)
+    if matcher is None:
+        matcher = RestaurantMatcher.build(version)
+        cache.set(key, matcher, timeout=MATCHER_TIMEOUT)
+    _local_matcher = matcher
+    return matcher
+
+
+def get_capable_restaurant_ids(product_ids):
+    """Возвращает id ресторанов, которые могут приготовить все товары заказа"""
+    return get_restaurant_matcher().capable_restaurant_ids(product_ids)
+
+
+def bump_menu_version():
+    """Сбрасывает индекс после изменения меню ресторанов"""
+    bump_cache_version(MENU_VERSION_KEY)
@@ -0,0 +1,55 @@
+from django.db import transaction
+
+from .candidates import mark_stale_for_products
+from .catalog import bump_catalog_version
+from .matching import bump_menu_version
+from .models import RestaurantMenuItem
+
+
+def set_menu_availability(restaurant, product_ids, available):
+    """Включает или выключает товары в меню ресторана одним запросом.
+
+    Выключаются только товары, уже добавленные в меню. Включение
+    добавляет недостающие пункты меню через INSERT ... ON CONFLICT.
+    Сигналы моделей при массовом обновлении не срабатывают, поэтому кэши
+    каталога и индекса ресторанов сбрасываются здесь один раз на весь
+    пакет. Возвращает словарь {id товара: в продаже} после изменения.
+    """
+    product_ids = set(product_ids)
+    with transaction.atomic():
+        if available:
+            RestaurantMenuItem.objects.bulk_create(
+                [
+                    RestaurantMenuItem(restaurant=restaurant, product_id=product_id, availability=True)
+                    for product_id in product_ids
+                ],
+                update_conflicts=True,
+                unique_fields=['restaurant', 'product'],
+                update_fields=['availability'],
+            )
+            changed = True
+        else:
+            changed = RestaurantMenuItem.objects.filter(
+                restaurant=restaurant,
+                product_id__in=product_ids,
+                availability=True,
+            ).update(availability=False)
+
+        if changed:
+            transaction.on_commit(lambda: invalidate_menu_caches(product_ids))
+
+    availability = dict.fromkeys(product_ids, False)
+    availability.update(
+        RestaurantMenuItem.objects.filter(
+            restaurant=restaurant,
+            product_id__in=product_ids,
+        ).values_list('product_id', 'availability')
+    )
+    return availability
+
+
+def invalidate_menu_caches(product_ids):
+    """Сбрасывает каталог, индекс ресторанов и кандидатов заказов после правки меню"""
+    bump_catalog_version()
+    bump_menu_version()
+    mark_stale_for_products(product_ids)
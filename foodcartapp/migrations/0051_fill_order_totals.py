@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    """Заполняем сумму существующих заказов по их позициям"""
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+
+    totals = (
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(ExpressionWrapper(
+            F('price') * F('quantity'),
+            output_field=DecimalField(max_digits=10, decimal_places=2)
+        )))
+        .values('total')
+    )
+    Order.objects.update(total=Coalesce(
+        Subquery(totals),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    ))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ('foodcartapp', '0050_order_total'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
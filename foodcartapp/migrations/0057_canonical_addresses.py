@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:59
+
+import re
+
+from django.db import migrations, models
+
+
+# Копия locations.normalization на момент миграции: будущие правки
+# нормализации не должны менять то, что делает эта миграция
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-кт': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+TOKEN_RE = re.compile(r'\w+(?:-\w+)*')
+
+
+def normalize_address(address):
+    if not address:
+        return ''
+    address = address.casefold().replace('ё', 'е')
+    tokens = TOKEN_RE.findall(address)
+    return ' '.join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def fill_canonical_addresses(apps, schema_editor):
+    """Заполняем канонические адреса заказов и ресторанов"""
+    for model_name in ['Order', 'Restaurant']:
+        model = apps.get_model('foodcartapp', model_name)
+        changed = []
+        for instance in model.objects.only('id', 'address').iterator(chunk_size=1000):
+            instance.canonical_address = normalize_address(instance.address)
+            changed.append(instance)
+            if len(changed) >= 1000:
+                model.objects.bulk_update(changed, ['canonical_address'])
+                changed = []
+        if changed:
+            model.objects.bulk_update(changed, ['canonical_address'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0056_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='canonical_address',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='канонический адрес'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='canonical_address',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255, verbose_name='канонический адрес'),
+        ),
+        migrations.RunPython(fill_canonical_addresses, migrations.RunPython.noop),
+    ]
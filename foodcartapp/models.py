@@ -1,10 +1,14 @@
+import uuid
+
 from django.db import models
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from phonenumber_field.modelfields import PhoneNumberField
 from django.utils import timezone
-from geopy.distance import distance
-from django.db.models import F, Sum, ExpressionWrapper, DecimalField
+from locations.lookup import get_coordinates
+from locations.normalization import normalize_address
+from django.db.models import F, Sum, ExpressionWrapper, DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
 
 
 class Restaurant(models.Model):
@@ -17,6 +21,13 @@ class Restaurant(models.Model):
         max_length=100,
         blank=True,
     )
+    canonical_address = models.CharField(
+        'канонический адрес',
+        max_length=255,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
     contact_phone = models.CharField(
         'контактный телефон',
         max_length=50,
@@ -30,16 +41,15 @@ class Restaurant(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.canonical_address = normalize_address(self.address)
+        if kwargs.get('update_fields') is not None and 'address' in kwargs['update_fields']:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'canonical_address'}
+        super().save(*args, **kwargs)
+
     def get_coordinates(self):
-        """Возвращает координаты ресторана через Location"""
-        from locations.models import Location
-        try:
-            location = Location.objects.get(address=self.address)
-            if location.latitude and location.longitude:
-                return (location.latitude, location.longitude)
-        except Location.DoesNotExist:
-            pass
-        return None
+        """Возвращает координаты ресторана через кэш Location"""
+        return get_coordinates(self.address)
 
 
 class ProductQuerySet(models.QuerySet):
@@ -170,9 +180,34 @@ class OrderItem(models.Model):
         return f"{self.product.name} x{self.quantity}"
 
 
+def calculated_total_expression():
+    """Подзапрос суммы позиций заказа для аннотаций и UPDATE"""
+    totals = (
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .values('order')
+        .annotate(total=Sum(
+            ExpressionWrapper(
+                F('price') * F('quantity'),
+                output_field=DecimalField(max_digits=10, decimal_places=2)
+            )
+        ))
+        .values('total')
+    )
+    return Coalesce(
+        Subquery(totals),
+        Value(0),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
 class OrderQuerySet(models.QuerySet):
     def with_total_cost(self):
-        """Добавляет аннотацию с общей стоимостью заказа"""
+        """Добавляет аннотацию с общей стоимостью заказа, посчитанной по позициям.
+
+        Для списков заказов используйте сохраненное поле Order.total,
+        аннотация нужна для сверки с ним.
+        """
         return self.annotate(
             total_cost=Sum(
                 ExpressionWrapper(
@@ -182,6 +217,18 @@ class OrderQuerySet(models.QuerySet):
             )
         )
 
+    def with_calculated_total(self):
+        """Добавляет сумму по позициям отдельным подзапросом, без GROUP BY"""
+        return self.annotate(calculated_total=calculated_total_expression())
+
+    def refresh_totals(self):
+        """Пересчитывает сохраненные суммы заказов одним UPDATE"""
+        return self.update(total=calculated_total_expression())
+
+    def with_stale_total(self):
+        """Заказы, у которых сохраненная сумма расходится с позициями"""
+        return self.with_calculated_total().exclude(total=F('calculated_total'))
+
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -191,6 +238,14 @@ class Order(models.Model):
         ('canceled', 'Отменен'),
     ]
 
+    # Из какого статуса в какие может перейти заказ
+    STATUS_TRANSITIONS = {
+        'new': ['processing', 'canceled'],
+        'processing': ['completed', 'canceled'],
+        'completed': [],
+        'canceled': [],
+    }
+
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'Наличными'),
         ('electronic', 'Электронно'),
@@ -212,6 +267,13 @@ class Order(models.Model):
         'адрес',
         max_length=200
     )
+    canonical_address = models.CharField(
+        'канонический адрес',
+        max_length=255,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
     status = models.CharField(
         'статус',
         max_length=20,
@@ -260,6 +322,24 @@ class Order(models.Model):
         'комментарий менеджера',
         blank=True
     )
+    candidates_stale = models.BooleanField(
+        'нужно пересчитать рестораны',
+        default=True,
+        db_index=True
+    )
+    total = models.DecimalField(
+        'сумма заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        db_index=True,
+        validators=[MinValueValidator(0)]
+    )
+    version = models.PositiveIntegerField(
+        'версия',
+        default=1,
+        editable=False
+    )
 
     objects = OrderQuerySet.as_manager()
 
@@ -271,19 +351,210 @@ class Order(models.Model):
     def __str__(self):
         return f"Заказ #{self.id} - {self.firstname} {self.lastname}"
 
+    def save(self, *args, **kwargs):
+        self.canonical_address = normalize_address(self.address)
+        # Любое сохранение меняет версию, чтобы смена статуса по устаревшим
+        # данным не затерла правку из админки
+        if self._state.adding:
+            return super().save(*args, **kwargs)
+
+        self.version = F('version') + 1
+        if kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+            if 'address' in kwargs['update_fields']:
+                kwargs['update_fields'].add('canonical_address')
+        super().save(*args, **kwargs)
+        self.refresh_from_db(fields=['version'])
+
+    def calculate_total(self):
+        """Считает сумму заказа по его позициям"""
+        total = self.items.aggregate(
+            total=Sum(
+                ExpressionWrapper(
+                    F('price') * F('quantity'),
+                    output_field=DecimalField(max_digits=10, decimal_places=2)
+                )
+            )
+        )['total']
+        return total or 0
+
+    def update_total(self):
+        """Пересчитывает и сохраняет сумму заказа"""
+        self.total = self.calculate_total()
+        self.save(update_fields=['total'])
+
     def is_address_found(self):
         """Проверяет, найден ли адрес заказа в геокодере"""
         return self.get_coordinates() is not None
 
     def get_coordinates(self):
-        """Возвращает координаты заказа через Location"""
-        from locations.models import Location
-        try:
-            location = Location.objects.get(address=self.address)
-            if location.latitude and location.longitude:
-                return (location.latitude, location.longitude)
-        except Location.DoesNotExist:
-            pass
-        return None
+        """Возвращает координаты заказа через кэш Location"""
+        return get_coordinates(self.address)
 
 
+class OrderCandidate(models.Model):
+    order = models.ForeignKey(
+        Order,
+        related_name='candidates',
+        verbose_name='заказ',
+        on_delete=models.CASCADE
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        related_name='order_candidates',
+        verbose_name='ресторан',
+        on_delete=models.CASCADE
+    )
+    distance_km = models.FloatField(
+        'расстояние, км',
+        null=True,
+        blank=True
+    )
+    rank = models.PositiveIntegerField(
+        'место'
+    )
+
+    class Meta:
+        verbose_name = 'ресторан-кандидат'
+        verbose_name_plural = 'рестораны-кандидаты'
+        ordering = ['order', 'rank']
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+
+    def __str__(self):
+        return f"{self.order_id}: {self.restaurant} ({self.distance_km} км)"
+
+
+class OrderIntake(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Заказ создан'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    tracking_id = models.UUIDField(
+        'номер для отслеживания',
+        default=uuid.uuid4,
+        unique=True,
+        editable=False
+    )
+    payload = models.JSONField(
+        'проверенные данные заказа'
+    )
+    status = models.CharField(
+        'статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True
+    )
+    order = models.OneToOneField(
+        Order,
+        related_name='intake',
+        verbose_name='заказ',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    attempts = models.PositiveIntegerField(
+        'попыток',
+        default=0
+    )
+    last_error = models.TextField(
+        'последняя ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        'дата создания',
+        auto_now_add=True,
+        db_index=True
+    )
+    updated_at = models.DateTimeField(
+        'дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'входящий заказ'
+        verbose_name_plural = 'входящие заказы'
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.tracking_id} ({self.get_status_display()})"
+
+
+class OrderEvent(models.Model):
+    CREATED = 'created'
+    UPDATED = 'updated'
+    KIND_CHOICES = [
+        (CREATED, 'Новый заказ'),
+        (UPDATED, 'Заказ изменен'),
+    ]
+
+    id = models.BigAutoField(
+        primary_key=True
+    )
+    order = models.ForeignKey(
+        Order,
+        related_name='events',
+        verbose_name='заказ',
+        on_delete=models.CASCADE
+    )
+    kind = models.CharField(
+        'событие',
+        max_length=20,
+        choices=KIND_CHOICES
+    )
+    created_at = models.DateTimeField(
+        'дата события',
+        auto_now_add=True,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'событие заказа'
+        verbose_name_plural = 'события заказов'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.order_id}: {self.get_kind_display()}"
+
+
+class IdempotencyKey(models.Model):
+    key = models.CharField(
+        'ключ',
+        max_length=100,
+        unique=True
+    )
+    fingerprint = models.CharField(
+        'отпечаток запроса',
+        max_length=64
+    )
+    response_status = models.PositiveSmallIntegerField(
+        'код ответа',
+        null=True,
+        blank=True
+    )
+    response_data = models.JSONField(
+        'ответ',
+        null=True,
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        'дата создания',
+        default=timezone.now,
+        db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self):
+        return self.key
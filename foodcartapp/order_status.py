@@ -0,0 +1,88 @@
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .events import record_order_events
+from .models import Order, OrderEvent
+
+
+# Статусы, в которых заказу еще можно назначить ресторан
+EDITABLE_STATUSES = ['new', 'processing']
+
+# Отметка времени, которая проставляется при первом переходе в статус
+STATUS_TIMESTAMPS = {
+    'processing': 'called_at',
+    'completed': 'delivered_at',
+}
+
+
+class OrderTransitionError(Exception):
+    """Статус заказа нельзя изменить"""
+
+    def __init__(self, message, order=None):
+        super().__init__(message)
+        self.order = order
+
+
+class OrderVersionConflict(OrderTransitionError):
+    """Заказ успел изменить кто-то другой"""
+
+
+class InvalidOrderTransition(OrderTransitionError):
+    """Переход между статусами не разрешен"""
+
+
+def allowed_statuses(status):
+    """Возвращает статусы, в которые можно перевести заказ из status"""
+    return Order.STATUS_TRANSITIONS.get(status, [])
+
+
+def source_statuses(status):
+    """Возвращает статусы, из которых можно перейти в status"""
+    return [
+        source for source, targets in Order.STATUS_TRANSITIONS.items()
+        if status in targets
+    ]
+
+
+def transition_order(order_id, version, status=None, cooking_restaurant=None):
+    """Меняет статус и ресторан заказа одним UPDATE ... WHERE id AND version.
+
+    Проверка версии и допустимости перехода входит в условие UPDATE, так
+    что гонка между менеджерами решается базой. Меняются только переданные
+    поля и отметки времени звонка и доставки. Если ничего не обновилось,
+    заказ перечитывается, чтобы объяснить причину. Возвращает заказ
+    в новом состоянии.
+    """
+    orders = Order.objects.filter(id=order_id, version=version)
+    fields = {'version': F('version') + 1}
+
+    if cooking_restaurant is not None:
+        orders = orders.filter(status__in=EDITABLE_STATUSES)
+        fields['cooking_restaurant'] = cooking_restaurant
+    if status is not None:
+        orders = orders.filter(status__in=source_statuses(status))
+        fields['status'] = status
+        timestamp_field = STATUS_TIMESTAMPS.get(status)
+        if timestamp_field:
+            fields[timestamp_field] = Coalesce(F(timestamp_field), Value(timezone.now()))
+
+    if orders.update(**fields):
+        record_order_events([order_id], OrderEvent.UPDATED)
+        return Order.objects.select_related('cooking_restaurant').get(id=order_id)
+
+    order = Order.objects.filter(id=order_id).first()
+    if order is None:
+        raise Order.DoesNotExist(f"Заказ {order_id} не найден")
+    if order.version != version:
+        raise OrderVersionConflict('Заказ уже изменил другой менеджер', order)
+    if status is None:
+        raise InvalidOrderTransition(
+            f"Нельзя сменить ресторан у заказа в статусе «{order.get_status_display()}»",
+            order,
+        )
+    raise InvalidOrderTransition(
+        f"Нельзя перевести заказ из статуса «{order.get_status_display()}» "
+        f"в «{dict(Order.STATUS_CHOICES).get(status, status)}»",
+        order,
+    )
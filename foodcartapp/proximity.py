@@ -0,0 +1,196 @@
+import heapq
+import math
+
+from django.core.cache import cache
+
+from locations.models import Location
+
+from .matching import get_restaurant_matcher
+from .models import Restaurant
+from .versioning import bump_cache_version, get_cache_version
+
+
+RESTAURANTS_GEO_VERSION_KEY = 'foodcartapp:restaurants:geo:version'
+SPATIAL_INDEX_KEY = 'foodcartapp:restaurants:geo:index:{version}'
+SPATIAL_INDEX_TIMEOUT = 24 * 60 * 60
+
+EARTH_RADIUS_KM = 6371.0088
+
+_local_index = None
+
+
+def to_unit_vector(latitude, longitude):
+    """Переводит широту и долготу в точку на единичной сфере"""
+    latitude = math.radians(latitude)
+    longitude = math.radians(longitude)
+    return (
+        math.cos(latitude) * math.cos(longitude),
+        math.cos(latitude) * math.sin(longitude),
+        math.sin(latitude),
+    )
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(chord / 2, 1))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(km / (2 * EARTH_RADIUS_KM), math.pi / 2))
+
+
+class KDNode:
+    __slots__ = ['point', 'restaurant_id', 'axis', 'left', 'right']
+
+    def __init__(self, point, restaurant_id, axis, left, right):
+        self.point = point
+        self.restaurant_id = restaurant_id
+        self.axis = axis
+        self.left = left
+        self.right = right
+
+    def __getstate__(self):
+        return (self.point, self.restaurant_id, self.axis, self.left, self.right)
+
+    def __setstate__(self, state):
+        self.point, self.restaurant_id, self.axis, self.left, self.right = state
+
+
+def build_kd_tree(points, depth=0):
+    """Строит KD-дерево из списка пар (точка, id ресторана)"""
+    if not points:
+        return None
+    axis = depth % 3
+    points = sorted(points, key=lambda item: item[0][axis])
+    median = len(points) // 2
+    point, restaurant_id = points[median]
+    return KDNode(
+        point,
+        restaurant_id,
+        axis,
+        build_kd_tree(points[:median], depth + 1),
+        build_kd_tree(points[median + 1:], depth + 1),
+    )
+
+
+class RestaurantSpatialIndex:
+    """KD-дерево ресторанов по координатам их адресов.
+
+    Точки хранятся как векторы на единичной сфере: длина хорды между
+    ними монотонно растет с расстоянием по поверхности Земли, поэтому
+    ближайшие по хорде рестораны — ближайшие и на местности.
+    """
+
+    def __init__(self, version, root, canonical_addresses):
+        self.version = version
+        self.root = root
+        self.canonical_addresses = canonical_addresses
+
+    @classmethod
+    def build(cls, version):
+        canonical_addresses = dict(Restaurant.objects.values_list('id', 'canonical_address'))
+        coordinates = {
+            canonical_address: (latitude, longitude)
+            for canonical_address, latitude, longitude in Location.objects.filter(
+                canonical_address__in=canonical_addresses.values(),
+                latitude__isnull=False,
+                longitude__isnull=False,
+            ).values_list('canonical_address', 'latitude', 'longitude')
+        }
+
+        points = [
+            (to_unit_vector(*coordinates[canonical_address]), restaurant_id)
+            for restaurant_id, canonical_address in canonical_addresses.items()
+            if canonical_address in coordinates
+        ]
+        return cls(version, build_kd_tree(points), set(canonical_addresses.values()))
+
+    def nearest(self, coords, k=None, max_km=None, accept=None):
+        """Возвращает до k пар (id ресторана, км), ближайших к точке.
+
+        Рестораны дальше max_km и не прошедшие проверку accept
+        пропускаются, поиск продолжается по остальным веткам дерева.
+        """
+        if self.root is None or k == 0:
+            return []
+
+        target = to_unit_vector(*coords)
+        max_distance = km_to_chord(max_km) ** 2 if max_km is not None else math.inf
+        found = []
+
+        def bound():
+            if k is not None and len(found) >= k:
+                return -found[0][0]
+            return max_distance
+
+        stack = [(self.root, 0)]
+        while stack:
+            node, min_distance = stack.pop()
+            if node is None or min_distance > bound():
+                continue
+
+            distance = sum((a - b) ** 2 for a, b in zip(target, node.point))
+            if distance <= bound() and (accept is None or accept(node.restaurant_id)):
+                heapq.heappush(found, (-distance, node.restaurant_id))
+                if k is not None and len(found) > k:
+                    heapq.heappop(found)
+
+            diff = target[node.axis] - node.point[node.axis]
+            near, far = (node.left, node.right) if diff < 0 else (node.right, node.left)
+            stack.append((far, diff ** 2))
+            stack.append((near, 0))
+
+        return sorted(
+            ((restaurant_id, chord_to_km(math.sqrt(-distance))) for distance, restaurant_id in found),
+            key=lambda item: item[1],
+        )
+
+
+def get_spatial_index():
+    """Возвращает KD-дерево ресторанов для текущей версии их адресов"""
+    global _local_index
+
+    version = get_cache_version(RESTAURANTS_GEO_VERSION_KEY)
+    if _local_index is not None and _local_index.version == version:
+        return _local_index
+
+    key = SPATIAL_INDEX_KEY.format(version=version)
+    index = cache.get(key)
+    if index is None:
+        index = RestaurantSpatialIndex.build(version)
+        cache.set(key, index, timeout=SPATIAL_INDEX_TIMEOUT)
+    _local_index = index
+    return index
+
+
+def bump_restaurants_geo_version():
+    """Сбрасывает KD-дерево после изменения ресторанов или их координат"""
+    bump_cache_version(RESTAURANTS_GEO_VERSION_KEY)
+
+
+def nearest_capable_restaurants(order, k=5, max_km=None):
+    """Ближайшие к заказу рестораны, которые могут приготовить его целиком.
+
+    Возвращает список пар (ресторан, расстояние в км), отсортированный по
+    расстоянию. Если адрес заказа еще не геокодирован, список пуст.
+    """
+    coords = order.get_coordinates()
+    if coords is None:
+        return []
+
+    matcher = get_restaurant_matcher()
+    mask = matcher.capable_mask({item.product_id for item in order.items.all()})
+    if not mask:
+        return []
+
+    nearest = get_spatial_index().nearest(
+        coords,
+        k=k,
+        max_km=max_km,
+        accept=lambda restaurant_id: matcher.is_capable(mask, restaurant_id),
+    )
+    restaurants = Restaurant.objects.in_bulk([restaurant_id for restaurant_id, _ in nearest])
+    return [
+        (restaurants[restaurant_id], distance)
+        for restaurant_id, distance in nearest
+        if restaurant_id in restaurants
+    ]
@@ -1,6 +1,6 @@
 from django.db import transaction
 from rest_framework import serializers
-from .models import Order, OrderItem, Product
+from .models import Order, OrderItem, Product, Restaurant
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -10,12 +10,6 @@ class OrderItemSerializer(serializers.ModelSerializer):
         model = OrderItem
         fields = ['product', 'quantity']
 
-    def validate_product(self, value):
-        """Проверяем что продукт существует"""
-        if not Product.objects.filter(id=value).exists():
-            raise serializers.ValidationError(f"Продукт с ID {value} не найден")
-        return value
-
     def validate_quantity(self, value):
         """Проверяем количество"""
         if value < 1:
@@ -53,27 +47,77 @@ class OrderSerializer(serializers.ModelSerializer):
         return value.strip()
 
     def validate_products(self, value):
-        """Проверяем список продуктов"""
+        """Проверяем список продуктов одним запросом к БД"""
         if not value:
             raise serializers.ValidationError("Список продуктов не может быть пустым")
+
+        product_ids = {item['product']['id'] for item in value}
+        self.products_by_id = Product.objects.only('id', 'price').in_bulk(product_ids)
+
+        missing_ids = sorted(product_ids - self.products_by_id.keys())
+        if missing_ids:
+            raise serializers.ValidationError(
+                [f"Продукт с ID {product_id} не найден" for product_id in missing_ids]
+            )
         return value
 
     @transaction.atomic
     def create(self, validated_data):
         """Создаем заказ и товары в заказе в одной транзакции"""
         products_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
 
+        order_items = []
         for product_data in products_data:
-            product_id = product_data['product']['id']
-            quantity = product_data['quantity']
-            product = Product.objects.get(id=product_id)
-
-            OrderItem.objects.create(
-                order=order,
+            product = self.products_by_id[product_data['product']['id']]
+            order_items.append(OrderItem(
                 product=product,
-                quantity=quantity,
+                quantity=product_data['quantity'],
                 price=product.price
-            )
+            ))
+
+        order = Order.objects.create(
+            **validated_data,
+            total=sum(item.price * item.quantity for item in order_items),
+        )
+        for order_item in order_items:
+            order_item.order = order
+        OrderItem.objects.bulk_create(order_items)
 
         return order
+
+
+class MenuAvailabilitySerializer(serializers.Serializer):
+    restaurant = serializers.PrimaryKeyRelatedField(queryset=Restaurant.objects.all())
+    products = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=1000,
+    )
+    available = serializers.BooleanField()
+
+    def validate_products(self, value):
+        """Проверяем, что все товары существуют, одним запросом"""
+        product_ids = set(value)
+        existing_ids = set(
+            Product.objects.filter(id__in=product_ids).values_list('id', flat=True)
+        )
+        missing_ids = sorted(product_ids - existing_ids)
+        if missing_ids:
+            raise serializers.ValidationError(
+                [f"Продукт с ID {product_id} не найден" for product_id in missing_ids]
+            )
+        return sorted(product_ids)
+
+
+class OrderTransitionSerializer(serializers.Serializer):
+    version = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES, required=False)
+    cooking_restaurant = serializers.PrimaryKeyRelatedField(
+        queryset=Restaurant.objects.all(),
+        required=False,
+    )
+
+    def validate(self, attrs):
+        if 'status' not in attrs and 'cooking_restaurant' not in attrs:
+            raise serializers.ValidationError("Укажите новый статус или ресторан")
+        return attrs
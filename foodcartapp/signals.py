@@ -0,0 +1,78 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from locations.models import Location
+from locations.signals import locations_changed
+
+from .candidates import mark_stale_for_addresses, mark_stale_for_products, mark_stale_for_restaurants
+from .catalog import bump_catalog_version
+from .events import record_order_events
+from .matching import bump_menu_version
+from .models import Order, OrderEvent, Product, ProductCategory, Restaurant, RestaurantMenuItem
+from .proximity import bump_restaurants_geo_version, get_spatial_index
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=RestaurantMenuItem)
+def invalidate_catalog(sender, **kwargs):
+    """Сбрасывает кэш каталога при изменении товаров, категорий и меню"""
+    bump_catalog_version()
+
+
+@receiver([post_save, post_delete], sender=RestaurantMenuItem)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_restaurant_matcher(sender, **kwargs):
+    """Сбрасывает индекс ресторанов при изменении меню"""
+    bump_menu_version()
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def invalidate_spatial_index(sender, **kwargs):
+    """Сбрасывает KD-дерево ресторанов при изменении их адресов"""
+    bump_restaurants_geo_version()
+
+
+@receiver([post_save, post_delete], sender=Location)
+def invalidate_spatial_index_on_location(sender, instance, **kwargs):
+    """Сбрасывает KD-дерево, если изменились координаты адреса ресторана"""
+    if instance.canonical_address in get_spatial_index().canonical_addresses:
+        bump_restaurants_geo_version()
+
+
+@receiver(locations_changed)
+def invalidate_spatial_index_on_locations(sender, canonical_addresses, **kwargs):
+    """То же для массового обновления координат"""
+    if canonical_addresses & get_spatial_index().canonical_addresses:
+        bump_restaurants_geo_version()
+
+
+@receiver([post_save, post_delete], sender=RestaurantMenuItem)
+def invalidate_candidates_on_menu(sender, instance, **kwargs):
+    """Помечает заказы с товаром для пересчета ресторанов-кандидатов"""
+    mark_stale_for_products([instance.product_id])
+
+
+@receiver(post_save, sender=Restaurant)
+def invalidate_candidates_on_restaurant(sender, instance, created, **kwargs):
+    """Помечает для пересчета заказы, где ресторан кандидат или может им стать"""
+    if not created:
+        mark_stale_for_restaurants([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Location)
+def invalidate_candidates_on_location(sender, instance, **kwargs):
+    """Помечает заказы для пересчета после геокодирования адреса"""
+    mark_stale_for_addresses({instance.canonical_address})
+
+
+@receiver(locations_changed)
+def invalidate_candidates_on_locations(sender, canonical_addresses, **kwargs):
+    """То же для массового обновления координат"""
+    mark_stale_for_addresses(canonical_addresses)
+
+
+@receiver(post_save, sender=Order)
+def log_order_change(sender, instance, created, **kwargs):
+    """Пишет событие в журнал для ленты заказов менеджера"""
+    record_order_events([instance.id], OrderEvent.CREATED if created else OrderEvent.UPDATED)
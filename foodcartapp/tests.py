@@ -0,0 +1,366 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from locations.distances import distance_matrix
+from locations.models import Location
+from locations.normalization import normalize_address
+
+from .candidates import refresh_order_candidates
+from .idempotency import IdempotentRequest, fingerprint
+from .intake import process_order_intake
+from .matching import get_capable_restaurant_ids
+from .menu import set_menu_availability
+from .proximity import nearest_capable_restaurants
+from .models import IdempotencyKey, Order, OrderEvent, OrderIntake, OrderItem, Product, Restaurant, RestaurantMenuItem
+
+
+class RegisterOrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = Product.objects.bulk_create([
+            Product(name=f'Бургер {number}', price=100 + number, image='burger.jpg')
+            for number in range(100)
+        ])
+
+    def setUp(self):
+        cache.clear()
+
+    def post_order(self, products, **headers):
+        return self.client.post('/api/order/', {
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79291000000',
+            'address': 'Москва, Новый Арбат 10',
+            'products': products,
+        }, content_type='application/json', headers=headers)
+
+    def cart(self, size):
+        return [
+            {'product': product.id, 'quantity': 2}
+            for product in self.products[:size]
+        ]
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        query_counts = []
+        for size in [1, 10, 100]:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.post_order(self.cart(size))
+            self.assertEqual(response.status_code, 200)
+            query_counts.append(len(queries))
+
+        self.assertEqual(len(set(query_counts)), 1, query_counts)
+        self.assertLessEqual(query_counts[0], 8)
+
+    def test_items_are_saved_with_current_prices(self):
+        response = self.post_order(self.cart(10))
+
+        order = Order.objects.get(id=response.json()['order_id'])
+        items = order.items.order_by('product_id')
+        self.assertEqual(items.count(), 10)
+        for item, product in zip(items, self.products):
+            self.assertEqual(item.product_id, product.id)
+            self.assertEqual(item.price, product.price)
+            self.assertEqual(item.quantity, 2)
+        self.assertEqual(order.total, sum(product.price * 2 for product in self.products[:10]))
+
+    def test_unknown_products_are_rejected(self):
+        products = self.cart(2) + [{'product': 100500, 'quantity': 1}]
+
+        response = self.post_order(products)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('products', response.json()['errors'])
+        self.assertFalse(OrderItem.objects.exists())
+
+    def test_repeated_idempotency_key_returns_original_order(self):
+        first = self.post_order(self.cart(3), idempotency_key='checkout-1')
+        with CaptureQueriesContext(connection) as queries:
+            repeat = self.post_order(self.cart(3), idempotency_key='checkout-1')
+
+        self.assertEqual(repeat.status_code, 200)
+        self.assertEqual(repeat.json(), first.json())
+        self.assertEqual(repeat['Idempotent-Replayed'], 'true')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(Order.objects.count(), 1)
+
+        other_cart = self.post_order(self.cart(2), idempotency_key='checkout-1')
+        self.assertEqual(other_cart.status_code, 422)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_idempotency_key_is_shared_between_workers(self):
+        first = self.post_order(self.cart(3), idempotency_key='checkout-2')
+        # Повтор попадает в другой воркер со своим локальным кэшем
+        cache.clear()
+        repeat = self.post_order(self.cart(3), idempotency_key='checkout-2')
+
+        self.assertEqual(repeat.status_code, 200)
+        self.assertEqual(repeat.json(), first.json())
+        self.assertEqual(Order.objects.count(), 1)
+
+        IdempotencyKey.objects.create(
+            key=IdempotentRequest('order', 'checkout-3', b'').key,
+            fingerprint=fingerprint(b''),
+        )
+        in_progress = self.client.post(
+            '/api/order/', b'', content_type='application/json',
+            headers={'idempotency_key': 'checkout-3'},
+        )
+        self.assertEqual(in_progress.status_code, 409)
+
+    @override_settings(ORDER_INTAKE_MODE='queue')
+    def test_queued_order_is_saved_by_worker(self):
+        response = self.post_order(self.cart(3))
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(Order.objects.exists())
+
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['status'], OrderIntake.PENDING)
+
+        process_order_intake()
+
+        order_id = self.client.get(status_url).json()['order_id']
+        order = Order.objects.get(id=order_id)
+        self.assertEqual(order.items.count(), 3)
+        self.assertEqual(order.total, sum(product.price * 2 for product in self.products[:3]))
+
+
+class RestaurantMatcherTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_capable_restaurants_follow_menu_changes(self):
+        burger, fries = Product.objects.bulk_create([
+            Product(name='Бургер', price=100, image='burger.jpg'),
+            Product(name='Картошка', price=50, image='fries.jpg'),
+        ])
+        first, second = Restaurant.objects.bulk_create([
+            Restaurant(name='Первый'),
+            Restaurant(name='Второй'),
+        ])
+        RestaurantMenuItem.objects.create(restaurant=first, product=burger)
+        RestaurantMenuItem.objects.create(restaurant=first, product=fries)
+        second_fries = RestaurantMenuItem.objects.create(
+            restaurant=second, product=fries, availability=False
+        )
+        RestaurantMenuItem.objects.create(restaurant=second, product=burger)
+
+        self.assertEqual(get_capable_restaurant_ids({burger.id, fries.id}), [first.id])
+        self.assertEqual(get_capable_restaurant_ids({burger.id}), [first.id, second.id])
+
+        second_fries.availability = True
+        second_fries.save()
+
+        self.assertEqual(
+            get_capable_restaurant_ids({burger.id, fries.id}),
+            [first.id, second.id],
+        )
+        self.assertEqual(get_capable_restaurant_ids({burger.id, 100500}), [])
+
+    def test_bulk_availability_update(self):
+        burger, fries = Product.objects.bulk_create([
+            Product(name='Бургер', price=100, image='burger.jpg'),
+            Product(name='Картошка', price=50, image='fries.jpg'),
+        ])
+        restaurant = Restaurant.objects.create(name='Первый')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=burger)
+        self.assertEqual(get_capable_restaurant_ids({burger.id, fries.id}), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            availability = set_menu_availability(restaurant, [burger.id, fries.id], True)
+        self.assertEqual(availability, {burger.id: True, fries.id: True})
+        self.assertEqual(get_capable_restaurant_ids({burger.id, fries.id}), [restaurant.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            availability = set_menu_availability(restaurant, [fries.id], False)
+        self.assertEqual(availability, {fries.id: False})
+        self.assertEqual(get_capable_restaurant_ids({burger.id, fries.id}), [])
+
+
+class NearestCapableRestaurantsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(1)
+        cls.burger, cls.fries = Product.objects.bulk_create([
+            Product(name='Бургер', price=100, image='burger.jpg'),
+            Product(name='Картошка', price=50, image='fries.jpg'),
+        ])
+        cls.restaurants = Restaurant.objects.bulk_create([
+            Restaurant(
+                name=f'Ресторан {number}',
+                address=f'Москва, Ресторанная {number}',
+                canonical_address=normalize_address(f'Москва, Ресторанная {number}'),
+            )
+            for number in range(60)
+        ])
+        Location.objects.bulk_create([
+            Location(
+                address=restaurant.address,
+                canonical_address=restaurant.canonical_address,
+                latitude=rng.uniform(55.55, 55.95),
+                longitude=rng.uniform(37.35, 37.85),
+            )
+            for restaurant in cls.restaurants
+        ])
+        RestaurantMenuItem.objects.bulk_create([
+            RestaurantMenuItem(restaurant=restaurant, product=product)
+            for number, restaurant in enumerate(cls.restaurants)
+            for product in ([cls.burger, cls.fries] if number % 3 else [cls.burger])
+        ])
+
+        Location.objects.create(address='Москва, Арбат 1', latitude=55.75, longitude=37.59)
+        cls.order = Order.objects.create(
+            firstname='Иван', lastname='Петров', phonenumber='+79291000000',
+            address='Москва, Арбат 1',
+        )
+        OrderItem.objects.create(order=cls.order, product=cls.burger, quantity=1, price=100)
+        OrderItem.objects.create(order=cls.order, product=cls.fries, quantity=1, price=50)
+
+    def setUp(self):
+        cache.clear()
+
+    def brute_force(self, max_km=None):
+        capable = [number % 3 != 0 for number in range(len(self.restaurants))]
+        coordinates = dict(Location.objects.values_list('address', 'latitude'))
+        longitudes = dict(Location.objects.values_list('address', 'longitude'))
+        distances = distance_matrix(
+            [(55.75, 37.59)],
+            [(coordinates[r.address], longitudes[r.address]) for r in self.restaurants],
+        )[0]
+        candidates = sorted(
+            (distance, restaurant.id)
+            for restaurant, distance, is_capable in zip(self.restaurants, distances, capable)
+            if is_capable and (max_km is None or distance <= max_km)
+        )
+        return [restaurant_id for _, restaurant_id in candidates]
+
+    def test_matches_brute_force(self):
+        nearest = nearest_capable_restaurants(self.order, k=5)
+
+        self.assertEqual(
+            [restaurant.id for restaurant, _ in nearest],
+            self.brute_force()[:5],
+        )
+        distances = [distance for _, distance in nearest]
+        self.assertEqual(distances, sorted(distances))
+
+    def test_respects_max_distance(self):
+        nearest = nearest_capable_restaurants(self.order, k=None, max_km=7)
+
+        self.assertEqual(
+            [restaurant.id for restaurant, _ in nearest],
+            self.brute_force(max_km=7),
+        )
+
+    @override_settings(ORDER_CANDIDATES_LIMIT=8)
+    def test_materialized_candidates(self):
+        refresh_order_candidates([self.order.id])
+
+        self.assertEqual(
+            list(self.order.candidates.values_list('restaurant_id', flat=True)),
+            self.brute_force()[:8],
+        )
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.candidates_stale)
+
+        RestaurantMenuItem.objects.filter(restaurant=self.restaurants[1], product=self.fries).delete()
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.candidates_stale)
+
+        Order.objects.filter(id=self.order.id).update(candidates_stale=False)
+        location = Location.objects.get(canonical_address=self.order.canonical_address)
+        location.latitude = 55.76
+        location.save()
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.candidates_stale)
+
+    @override_settings(ORDER_CANDIDATES_LIMIT=2)
+    def test_restaurant_moved_into_range_becomes_candidate(self):
+        refresh_order_candidates([self.order.id])
+        far_restaurant = Restaurant.objects.get(id=self.brute_force()[-1])
+
+        far_restaurant.address = self.order.address
+        far_restaurant.save()
+
+        self.order.refresh_from_db()
+        self.assertTrue(self.order.candidates_stale)
+        refresh_order_candidates([self.order.id])
+        self.assertEqual(
+            self.order.candidates.values_list('restaurant_id', flat=True).first(),
+            far_restaurant.id,
+        )
+
+class OrderStatusTransitionTestCase(TestCase):
+    def setUp(self):
+        manager = User.objects.create_superuser('manager', 'manager@example.com', 'manager')
+        self.client.force_login(manager)
+        self.restaurant = Restaurant.objects.create(name='Первый')
+        self.order = Order.objects.create(
+            firstname='Иван', lastname='Петров', phonenumber='+79291000000',
+            address='Москва, Арбат 1',
+        )
+
+    def change(self, **data):
+        return self.client.post(
+            f'/api/orders/{self.order.id}/status/', data, content_type='application/json',
+        )
+
+    def test_transitions_follow_state_machine_and_version(self):
+        response = self.change(
+            version=1, status='processing', cooking_restaurant=self.restaurant.id,
+        )
+        self.assertEqual(response.status_code, 200)
+        order = response.json()['order']
+        self.assertEqual(order['version'], 2)
+        self.assertEqual(order['cooking_restaurant']['id'], self.restaurant.id)
+        self.assertIsNotNone(order['called_at'])
+
+        stale = self.change(version=1, status='canceled')
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(stale.json()['order']['status'], 'processing')
+
+        backwards = self.change(version=2, status='new')
+        self.assertEqual(backwards.status_code, 422)
+
+        self.assertEqual(self.change(version=2, status='completed').status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'completed')
+        self.assertIsNotNone(self.order.delivered_at)
+
+    def test_changes_are_logged_for_order_feed(self):
+        self.change(version=1, status='processing')
+        self.assertEqual(
+            list(self.order.events.order_by('id').values_list('kind', flat=True)),
+            [OrderEvent.CREATED, OrderEvent.UPDATED],
+        )
+
+
+class ProductListTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Бургер', price=100, image='burger.jpg')
+        restaurant = Restaurant.objects.create(name='Ресторан')
+        RestaurantMenuItem.objects.create(restaurant=restaurant, product=self.product)
+
+    def test_etag_allows_conditional_requests(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        for if_none_match in [etag, f'W/{etag}', f'"other", {etag}']:
+            with self.subTest(if_none_match=if_none_match):
+                cached = self.client.get('/api/products/', headers={'If-None-Match': if_none_match})
+                self.assertEqual(cached.status_code, 304)
+                self.assertEqual(cached['ETag'], etag)
+
+        self.product.price = 150
+        self.product.save()
+
+        changed = self.client.get('/api/products/', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()[0]['price'], '150.00')
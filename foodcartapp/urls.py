@@ -1,6 +1,7 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import product_list_api, banners_list_api, register_order, update_menu_availability, \
+    order_intake_status, change_order_status
 
 
 app_name = "foodcartapp"
@@ -9,4 +10,7 @@ urlpatterns = [
     path('products/', product_list_api),
     path('banners/', banners_list_api),
     path('order/', register_order),
+    path('order/intake/<uuid:tracking_id>/', order_intake_status, name='order_intake_status'),
+    path('orders/<int:order_id>/status/', change_order_status, name='change_order_status'),
+    path('menu/availability/', update_menu_availability, name='update_menu_availability'),
 ]
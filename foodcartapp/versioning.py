@@ -0,0 +1,18 @@
+import time
+
+from django.core.cache import cache
+
+
+def get_cache_version(key):
+    """Возвращает текущую версию данных, создавая её при первом обращении"""
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_cache_version(key):
+    """Выставляет новую версию, после чего старые кэши не используются"""
+    cache.set(key, time.time_ns(), timeout=None)
@@ -1,15 +1,30 @@
+from asgiref.sync import sync_to_async
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
+from django.utils.cache import get_conditional_response
 from django.templatetags.static import static
-from rest_framework.decorators import api_view
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
 from rest_framework.response import Response
 from rest_framework import status
 
-from .serializers import OrderSerializer
-from .models import Product, Order, OrderItem, Restaurant
+from locations.utils import enqueue_geocoding
 
+from .catalog import get_catalog_payload
+from .idempotency import IDEMPOTENCY_KEY_HEADER, IDEMPOTENCY_KEY_MAX_LENGTH, IN_PROGRESS, \
+    IdempotentRequest
+from .intake import enqueue_order
+from .menu import set_menu_availability
+from .order_status import OrderTransitionError, OrderVersionConflict, allowed_statuses, \
+    transition_order
+from .serializers import MenuAvailabilitySerializer, OrderSerializer, OrderTransitionSerializer
+from .models import Order, OrderIntake
 
-def banners_list_api(request):
+
+async def banners_list_api(request):
     return JsonResponse([
         {
             'title': 'Burger',
@@ -32,40 +47,73 @@ def banners_list_api(request):
     })
 
 
-def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+async def product_list_api(request):
+    body, etag = await sync_to_async(get_catalog_payload)()
+
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'
+    # If-None-Match сравнивается слабо, как требует RFC 9110: W/"..." тоже дает 304
+    return get_conditional_response(request, etag=etag, response=response)
 
 
 @api_view(['POST'])
 def register_order(request):
+    idempotency_key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+    if idempotency_key is None:
+        return create_order(request)
+
+    if not idempotency_key or len(idempotency_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return Response({
+            'status': 'error',
+            'message': 'Некорректный ключ идемпотентности',
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    idempotent_request = IdempotentRequest('order', idempotency_key, request.body)
+    entry = idempotent_request.acquire()
+    if entry is not None:
+        if not idempotent_request.matches(entry):
+            return Response({
+                'status': 'error',
+                'message': 'Ключ идемпотентности уже использован для другого заказа',
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if entry[0] == IN_PROGRESS:
+            return Response({
+                'status': 'error',
+                'message': 'Заказ с этим ключом еще обрабатывается',
+            }, status=status.HTTP_409_CONFLICT)
+        _, _, response_status, data = entry
+        response = Response(data, status=response_status)
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    try:
+        response = create_order(request)
+    except Exception:
+        idempotent_request.release()
+        raise
+    if status.is_success(response.status_code):
+        idempotent_request.save(response.status_code, response.data)
+    else:
+        idempotent_request.release()
+    return response
+
+
+def create_order(request):
     serializer = OrderSerializer(data=request.data)
 
+    if serializer.is_valid() and settings.ORDER_INTAKE_MODE == 'queue':
+        intake = enqueue_order(serializer)
+        return Response({
+            'tracking_id': str(intake.tracking_id),
+            'status': 'accepted',
+            'message': 'Заказ принят в обработку',
+            'status_url': reverse('foodcartapp:order_intake_status', args=[intake.tracking_id]),
+        }, status=status.HTTP_202_ACCEPTED)
+
     if serializer.is_valid():
         order = serializer.save()
+        enqueue_geocoding([order.address], requeue=True)
         return Response({
             'order_id': order.id,
             'status': 'success',
@@ -77,3 +125,95 @@ def register_order(request):
         'message': 'Невалидные данные заказа',
         'errors': serializer.errors
     }, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['GET'])
+def order_intake_status(request, tracking_id):
+    intake = get_object_or_404(
+        OrderIntake.objects.only('tracking_id', 'status', 'order_id'),
+        tracking_id=tracking_id,
+    )
+    return Response({
+        'tracking_id': str(intake.tracking_id),
+        'status': intake.status,
+        'order_id': intake.order_id,
+    })
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def update_menu_availability(request):
+    serializer = MenuAvailabilitySerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Невалидные данные меню',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    restaurant = serializer.validated_data['restaurant']
+    availability = set_menu_availability(
+        restaurant,
+        serializer.validated_data['products'],
+        serializer.validated_data['available'],
+    )
+    return Response({
+        'status': 'success',
+        'restaurant': restaurant.id,
+        'availability': {
+            str(product_id): available
+            for product_id, available in sorted(availability.items())
+        },
+    })
+
+
+def serialize_order_state(order):
+    return {
+        'id': order.id,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'next_statuses': allowed_statuses(order.status),
+        'version': order.version,
+        'called_at': order.called_at,
+        'delivered_at': order.delivered_at,
+        'cooking_restaurant': {
+            'id': order.cooking_restaurant.id,
+            'name': order.cooking_restaurant.name,
+        } if order.cooking_restaurant else None,
+    }
+
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def change_order_status(request, order_id):
+    serializer = OrderTransitionSerializer(data=request.data)
+
+    if not serializer.is_valid():
+        return Response({
+            'status': 'error',
+            'message': 'Невалидные данные заказа',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        order = transition_order(order_id, **serializer.validated_data)
+    except Order.DoesNotExist as e:
+        return Response({
+            'status': 'error',
+            'message': str(e),
+        }, status=status.HTTP_404_NOT_FOUND)
+    except OrderTransitionError as e:
+        return Response({
+            'status': 'error',
+            'message': str(e),
+            'order': serialize_order_state(e.order),
+        }, status=(
+            status.HTTP_409_CONFLICT if isinstance(e, OrderVersionConflict)
+            else status.HTTP_422_UNPROCESSABLE_ENTITY
+        ))
+
+    return Response({
+        'status': 'success',
+        'order': serialize_order_state(order),
+    })
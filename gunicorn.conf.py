@@ -0,0 +1,111 @@
+"""Настройки gunicorn для контейнера backend.
+
+SERVER_MODE выбирает, как обслуживать запросы:
+
+- asgi: воркеры uvicorn, один процесс держит много соединений, пока
+  асинхронные view ждут сети. Лента заказов менеджера работает как
+  настоящий поток server-sent events
+- wsgi: синхронные воркеры gunicorn, по запросу на поток
+
+Все числа можно переопределить переменными окружения, сравнить варианты
+помогает benchmarks/bench_workers.py.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+from environs import Env
+
+
+env = Env()
+env.read_env()
+
+cpu_count = multiprocessing.cpu_count()
+
+SERVER_MODE = env('SERVER_MODE', 'asgi')
+
+bind = env('GUNICORN_BIND', '0.0.0.0:8000')
+
+if SERVER_MODE == 'asgi':
+    wsgi_app = 'star_burger.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+    # Асинхронный воркер не простаивает в ожидании сети, лишние процессы
+    # сверх числа ядер только делят процессор
+    workers = env.int('WEB_CONCURRENCY', cpu_count + 1)
+else:
+    wsgi_app = 'star_burger.wsgi:application'
+    threads = env.int('GUNICORN_THREADS', 1)
+    if threads > 1:
+        worker_class = 'gthread'
+        # Потоки ждут БД параллельно, поэтому процессов нужно меньше
+        workers = env.int('WEB_CONCURRENCY', cpu_count + 1)
+    else:
+        workers = env.int('WEB_CONCURRENCY', cpu_count * 2 + 1)
+
+# Django, DRF и метаданные phonenumbers импортируются один раз в мастере,
+# воркеры после fork делят эти страницы памяти copy-on-write
+preload_app = env.bool('GUNICORN_PRELOAD', True)
+
+# Перезапуск воркера после max_requests запросов сдерживает рост памяти.
+# Разброс jitter не дает всем воркерам перезапуститься одновременно
+max_requests = env.int('GUNICORN_MAX_REQUESTS', 2000)
+max_requests_jitter = env.int('GUNICORN_MAX_REQUESTS_JITTER', 200)
+
+# Геокодер вызывается только фоновым воркером, обычным запросам к сайту
+# хватает и половины этого времени. Самый долгий запрос - поток ленты
+# заказов под ASGI, он закрывается сам через ORDER_FEED_TIMEOUT, поэтому
+# таймауты берутся от него с запасом: воркер не убивают посреди ленты,
+# и при остановке открытые ленты успевают закрыться сами
+ORDER_FEED_TIMEOUT = env.float('ORDER_FEED_TIMEOUT', 20)
+timeout = env.int('GUNICORN_TIMEOUT', int(ORDER_FEED_TIMEOUT) + 15)
+graceful_timeout = env.int('GUNICORN_GRACEFUL_TIMEOUT', int(ORDER_FEED_TIMEOUT) + 5)
+keepalive = env.int('GUNICORN_KEEPALIVE', 5)
+
+accesslog = env('GUNICORN_ACCESS_LOG', '') or None
+errorlog = '-'
+loglevel = env('GUNICORN_LOG_LEVEL', 'info')
+
+# gunicorn сам шлет в statsd число запросов, коды ответов, время ответа
+# и число воркеров
+statsd_host = env('STATSD_HOST', None)
+statsd_prefix = env('STATSD_PREFIX', 'star_burger')
+
+# Воркеры пишут метрики prometheus_client в общий каталог, /metrics любого
+# воркера складывает их
+metrics_dir = env('PROMETHEUS_MULTIPROC_DIR', None) or os.path.join(tempfile.gettempdir(), 'star_burger_metrics')
+os.makedirs(metrics_dir, exist_ok=True)
+os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+
+STARTUP_CHECK = env.bool('GUNICORN_STARTUP_CHECK', True)
+
+
+def on_starting(server):
+    # Файлы метрик прошлого запуска удаляются один раз в мастере: при
+    # перезагрузке по SIGHUP старые воркеры еще пишут в свои файлы
+    for path in glob.glob(os.path.join(metrics_dir, '*.db')):
+        os.remove(path)
+
+    if server.cfg.timeout <= ORDER_FEED_TIMEOUT:
+        server.log.warning(
+            'GUNICORN_TIMEOUT %s с не больше ORDER_FEED_TIMEOUT %s с: '
+            'воркеры с открытой лентой заказов будут убиты по таймауту',
+            server.cfg.timeout, ORDER_FEED_TIMEOUT,
+        )
+    if not STARTUP_CHECK:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'star_burger.settings')
+    import django
+    django.setup()
+
+    from star_burger.startup import StartupCheckError, check_startup
+    try:
+        check_startup(workers=server.cfg.workers)
+    except StartupCheckError as e:
+        server.log.error('Проверка окружения не пройдена: %s', e)
+        raise SystemExit(1)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,34 @@
+from .models import Location
+from .normalization import normalize_address
+
+
+def batch_check_addresses(addresses):
+    """Проверяет одним запросом, какие адреса уже геокодированы.
+
+    Возвращает словарь {адрес: True/False}. Адрес считается найденным,
+    если для его канонической формы в Location есть координаты; геокодер
+    при этом не вызывается.
+    """
+    canonical_addresses = {
+        address: normalize_address(address)
+        for address in addresses
+        if address
+    }
+    found = set(
+        Location.objects.filter(
+            canonical_address__in=set(canonical_addresses.values()),
+            latitude__isnull=False,
+            longitude__isnull=False,
+        ).values_list('canonical_address', flat=True)
+    )
+    return {
+        address: canonical_addresses.get(address) in found
+        for address in addresses
+    }
+
+
+def check_address_exists(address):
+    """Проверяет, известны ли координаты адреса"""
+    if not address:
+        return False
+    return batch_check_addresses([address])[address]
@@ -1,20 +1,28 @@
 from django.contrib import admin
-from .models import Location
+from .models import Location, GeocodingTask
 
 
 @admin.register(Location)
 class LocationAdmin(admin.ModelAdmin):
     list_display = ['address', 'latitude', 'longitude', 'updated_at', 'last_geocode_attempt']
     list_filter = ['updated_at', 'last_geocode_attempt']
-    search_fields = ['address']
-    readonly_fields = ['created_at', 'updated_at']
+    search_fields = ['address', 'canonical_address']
+    readonly_fields = ['canonical_address', 'created_at', 'updated_at']
 
     fieldsets = (
         (None, {
-            'fields': ('address', 'latitude', 'longitude')
+            'fields': ('address', 'canonical_address', 'latitude', 'longitude')
         }),
         ('Даты', {
             'fields': ('created_at', 'updated_at', 'last_geocode_attempt'),
             'classes': ('collapse',)
         }),
     )
+
+
+@admin.register(GeocodingTask)
+class GeocodingTaskAdmin(admin.ModelAdmin):
+    list_display = ['address', 'status', 'attempts', 'created_at', 'updated_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['address']
+    readonly_fields = ['created_at', 'updated_at', 'last_error']
@@ -0,0 +1,76 @@
+import numpy as np
+from geopy.distance import distance
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+HAVERSINE = 'haversine'
+GEODESIC = 'geodesic'
+PRECISION_MODES = [HAVERSINE, GEODESIC]
+
+
+def coordinates_to_array(coordinates):
+    """Переводит список пар (широта, долгота) в массив, None становится NaN"""
+    array = np.full((len(coordinates), 2), np.nan)
+    for index, coords in enumerate(coordinates):
+        if coords:
+            array[index] = coords
+    return array
+
+
+def haversine_matrix(origins, destinations):
+    """Расстояния в км между всеми парами точек на сфере за один проход"""
+    origins = np.radians(origins)
+    destinations = np.radians(destinations)
+
+    origin_lat = origins[:, 0, np.newaxis]
+    origin_lon = origins[:, 1, np.newaxis]
+    destination_lat = destinations[np.newaxis, :, 0]
+    destination_lon = destinations[np.newaxis, :, 1]
+
+    a = (
+        np.sin((destination_lat - origin_lat) / 2) ** 2
+        + np.cos(origin_lat) * np.cos(destination_lat)
+        * np.sin((destination_lon - origin_lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def geodesic_matrix(origins, destinations):
+    """Точные расстояния по эллипсоиду WGS-84, по одной паре за раз"""
+    matrix = np.full((len(origins), len(destinations)), np.nan)
+    for row, origin in enumerate(origins):
+        if np.isnan(origin).any():
+            continue
+        for column, destination in enumerate(destinations):
+            if not np.isnan(destination).any():
+                matrix[row, column] = distance(origin, destination).km
+    return matrix
+
+
+def distance_matrix(origins, destinations, mode=HAVERSINE):
+    """Матрица расстояний в км между точками origins и destinations.
+
+    Точки передаются парами (широта, долгота) или None, если координаты
+    неизвестны; для таких пар в матрице будет NaN. Режим haversine
+    считает всю матрицу векторно с погрешностью до 0.5%, geodesic точнее,
+    но медленнее на порядки.
+    """
+    if mode not in PRECISION_MODES:
+        raise ValueError(f"Неизвестный режим расчета расстояний: {mode}")
+
+    origins = coordinates_to_array(origins)
+    destinations = coordinates_to_array(destinations)
+    if not len(origins) or not len(destinations):
+        return np.empty((len(origins), len(destinations)))
+
+    if mode == GEODESIC:
+        return geodesic_matrix(origins, destinations)
+    return haversine_matrix(origins, destinations)
+
+
+def distance_or_none(value):
+    """Переводит элемент матрицы в float, а NaN — в None"""
+    if np.isnan(value):
+        return None
+    return float(value)
@@ -1,45 +1,368 @@
+import asyncio
+import csv
+import json
+import threading
+import time
+from contextvars import ContextVar
+
 import requests
-from requests.exceptions import HTTPError, RequestException
+from asgiref.sync import sync_to_async
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from urllib3.util.retry import Retry
 from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .normalization import normalize_address
+
+
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+RETRY_BACKOFF_FACTOR = 0.5
+
+# Список, в который geocode дописывает время каждого вызова. Middleware
+# метрик выставляет его на время запроса, чтобы посчитать обращения к
+# геокодеру именно этого запроса
+geocoder_timings = ContextVar('geocoder_timings', default=None)
+
+
+class GeocoderError(Exception):
+    """Геокодер не смог обработать запрос"""
+
+
+class GeocoderUnavailable(GeocoderError):
+    """Геокодер недоступен или перегружен, запрос стоит повторить позже"""
+
+
+class GeocoderAuthError(GeocoderError):
+    """Геокодер отклонил API-ключ"""
+
+
+class TokenBucket:
+    """Ограничивает частоту запросов к геокодеру из нескольких потоков"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity,
+                    self.tokens + (now - self.updated_at) * self.rate,
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class GeocoderMetrics:
+    """Счетчики обращений к геокодеру: количество, ошибки и время ответа"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.found = 0
+        self.not_found = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, elapsed, coords=None, error=None):
+        with self.lock:
+            self.calls += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            if error is not None:
+                self.errors += 1
+            elif coords is None:
+                self.not_found += 1
+            else:
+                self.found += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'found': self.found,
+                'not_found': self.not_found,
+                'errors': self.errors,
+                'total_seconds': self.total_seconds,
+                'max_seconds': self.max_seconds,
+            }
+
+
+def create_session(pool_size=10, retries=3, backoff_factor=RETRY_BACKOFF_FACTOR):
+    """Создает сессию с пулом соединений и повтором запросов на 429/5xx"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=['GET'],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class BaseGeocoder:
+    """Общий интерфейс геокодеров.
+
+    Наследники реализуют `_geocode`, который возвращает пару
+    (широта, долгота), None для ненайденного адреса или бросает
+    GeocoderError. Замеры времени и счетчики ведет `geocode`.
+    """
+
+    def __init__(self):
+        self.metrics = GeocoderMetrics()
+
+    @classmethod
+    def from_settings(cls, **options):
+        return cls(**options)
+
+    def geocode(self, address):
+        """Возвращает координаты (широта, долгота) адреса или None"""
+        started_at = time.perf_counter()
+        try:
+            coords = self._geocode(address)
+        except GeocoderError as error:
+            self.record(time.perf_counter() - started_at, error=error)
+            raise
+        self.record(time.perf_counter() - started_at, coords=coords)
+        return coords
+
+    async def ageocode(self, address):
+        """То же, что geocode, но ожидание ответа не занимает поток"""
+        started_at = time.perf_counter()
+        try:
+            coords = await self._ageocode(address)
+        except GeocoderError as error:
+            self.record(time.perf_counter() - started_at, error=error)
+            raise
+        self.record(time.perf_counter() - started_at, coords=coords)
+        return coords
+
+    def record(self, elapsed, coords=None, error=None):
+        self.metrics.record(elapsed, coords=coords, error=error)
+        timings = geocoder_timings.get()
+        if timings is not None:
+            timings.append(elapsed)
+
+    def _geocode(self, address):
+        raise NotImplementedError
+
+    async def _ageocode(self, address):
+        # Геокодер без асинхронного клиента ждет ответа в отдельном потоке
+        return await sync_to_async(self._geocode, thread_sensitive=False)(address)
 
+    def close(self):
+        pass
 
-def fetch_coordinates(apikey, address):
+    async def aclose(self):
+        pass
+
+
+class YandexGeocoder(BaseGeocoder):
     base_url = "https://geocode-maps.yandex.ru/1.x"
 
-    try:
-        response = requests.get(base_url, params={
+    def __init__(self, apikey, timeout=10, pool_size=10, retries=3):
+        super().__init__()
+        self.apikey = apikey
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.retries = retries
+        self.session = create_session(pool_size=pool_size, retries=retries)
+        self.async_client = None
+
+    @classmethod
+    def from_settings(cls, **options):
+        options = {
+            'apikey': settings.YANDEX_GEOCODER_APIKEY,
+            'timeout': settings.GEOCODER_TIMEOUT,
+            **options,
+        }
+        return cls(**options)
+
+    def get_params(self, address):
+        return {
             "geocode": address,
-            "apikey": apikey,
+            "apikey": self.apikey,
             "format": "json",
-        }, timeout=10)
+        }
+
+    def _geocode(self, address):
+        try:
+            response = self.session.get(
+                self.base_url, params=self.get_params(address), timeout=self.timeout,
+            )
+        except RequestException as e:
+            # Текст исключения requests содержит URL с API-ключом, в ошибку его не пишем
+            raise GeocoderUnavailable(f"Ошибка соединения с геокодером: {type(e).__name__}") from e
+        return self.parse_response(response)
+
+    def get_async_client(self):
+        """Возвращает httpx-клиент текущего цикла событий.
+
+        Клиент привязан к циклу, в котором создан, поэтому при запуске
+        через async_to_sync, где цикл каждый раз новый, он пересоздается.
+        """
+        # httpx нужен только асинхронному воркеру, сайт и команды его не грузят
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if self.async_client is None or self.async_client_loop is not loop:
+            self.async_client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.retries),
+            )
+            self.async_client_loop = loop
+        return self.async_client
 
+    async def _ageocode(self, address):
+        import httpx
+
+        client = self.get_async_client()
+        for attempt in range(self.retries + 1):
+            try:
+                response = await client.get(self.base_url, params=self.get_params(address))
+            except httpx.HTTPError as e:
+                raise GeocoderUnavailable(f"Ошибка соединения с геокодером: {type(e).__name__}") from e
+            if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                break
+            await asyncio.sleep(RETRY_BACKOFF_FACTOR * 2 ** attempt)
+        return self.parse_response(response)
+
+    @staticmethod
+    def parse_response(response):
         if response.status_code == 403:
-            print("Ошибка 403: Проверьте API-ключ и его настройки")
-            return None
-        elif response.status_code == 404:
-            print("Ошибка 404: API endpoint не найден")
-            return None
-        elif response.status_code != 200:
-            print(f"Ошибка {response.status_code}: {response.text}")
-            return None
-
-        response.raise_for_status()
-
-        found_places = response.json()['response']['GeoObjectCollection']['featureMember']
-
-        if not found_places:
-            return None
-
-        most_relevant = found_places[0]
-        lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-        return float(lon), float(lat)
-
-    except HTTPError as e:
-        print(f"HTTP ошибка: {e}")
-        return None
-    except RequestException as e:
-        print(f"Ошибка соединения: {e}")
-        return None
-    except Exception as e:
-        print(f"Общая ошибка при геокодировании адреса {address}: {e}")
-        return None
+            raise GeocoderAuthError("Ошибка 403: Проверьте API-ключ и его настройки")
+        if response.status_code in RETRY_STATUSES:
+            raise GeocoderUnavailable(f"Геокодер ответил {response.status_code}")
+        if response.status_code != 200:
+            raise GeocoderError(f"Ошибка {response.status_code}: {response.text[:200]}")
+
+        try:
+            found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+            if not found_places:
+                return None
+            most_relevant = found_places[0]
+            lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+            return float(lat), float(lon)
+        except (ValueError, KeyError, IndexError) as e:
+            raise GeocoderError(f"Неожиданный ответ геокодера: {e}") from e
+
+    def close(self):
+        self.session.close()
+
+    async def aclose(self):
+        if self.async_client is not None:
+            await self.async_client.aclose()
+            self.async_client = None
+
+
+class GazetteerGeocoder(BaseGeocoder):
+    """Офлайн-геокодер по локальному справочнику адресов.
+
+    Справочник — JSON-объект {"адрес": [широта, долгота]} или CSV с
+    колонками address, latitude, longitude. Адреса сравниваются по
+    каноническому ключу. Параметр delay имитирует задержку ответа
+    настоящего геокодера для нагрузочных тестов.
+    """
+
+    def __init__(self, path='', delay=0, entries=None, pool_size=None):
+        # pool_size принимается для совместимости с сетевыми геокодерами
+        super().__init__()
+        self.delay = delay
+        self.entries = {}
+        if path:
+            self.entries.update(self.load(path))
+        for address, coords in (entries or {}).items():
+            self.entries[normalize_address(address)] = tuple(map(float, coords))
+
+    @classmethod
+    def from_settings(cls, **options):
+        options = {
+            'path': settings.GEOCODER_GAZETTEER_PATH,
+            'delay': settings.GEOCODER_GAZETTEER_DELAY,
+            **options,
+        }
+        return cls(**options)
+
+    @staticmethod
+    def load(path):
+        with open(path, encoding='utf-8') as file:
+            if path.endswith('.csv'):
+                rows = [
+                    (row['address'], (row['latitude'], row['longitude']))
+                    for row in csv.DictReader(file)
+                ]
+            else:
+                rows = json.load(file).items()
+        return {
+            normalize_address(address): (float(lat), float(lon))
+            for address, (lat, lon) in rows
+        }
+
+    def _geocode(self, address):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.entries.get(normalize_address(address))
+
+    async def _ageocode(self, address):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self.entries.get(normalize_address(address))
+
+
+async def ageocode_many(geocoder, addresses, concurrency=10):
+    """Геокодирует адреса, держа не больше concurrency запросов одновременно.
+
+    Возвращает словарь {адрес: координаты, None или GeocoderError}.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def geocode(address):
+        async with semaphore:
+            try:
+                return await geocoder.ageocode(address)
+            except GeocoderError as e:
+                return e
+
+    results = await asyncio.gather(*[geocode(address) for address in addresses])
+    return dict(zip(addresses, results))
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def create_geocoder(**options):
+    """Создает новый экземпляр геокодера из настройки GEOCODER_BACKEND"""
+    backend = import_string(settings.GEOCODER_BACKEND)
+    return backend.from_settings(**options)
+
+
+def get_geocoder():
+    """Возвращает общий для процесса геокодер"""
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = create_geocoder()
+    return _geocoder
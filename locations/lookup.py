@@ -0,0 +1,132 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+
+from .models import Location
+from .normalization import normalize_address
+
+
+CACHE_KEY = 'locations:coordinates:{digest}'
+FOUND_TIMEOUT = 24 * 60 * 60
+NOT_FOUND_TIMEOUT = 10 * 60
+LOCAL_TIMEOUT = 60
+LOCAL_MAX_SIZE = 10000
+
+NOT_FOUND = ()
+
+
+class LRUCache:
+    """Небольшой потокобезопасный LRU-кэш в памяти процесса со сроком жизни записей"""
+
+    def __init__(self, max_size, timeout):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + self.timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LRUCache(LOCAL_MAX_SIZE, LOCAL_TIMEOUT)
+
+
+def get_cache_key(canonical_address):
+    digest = hashlib.sha1(canonical_address.encode('utf-8')).hexdigest()
+    return CACHE_KEY.format(digest=digest)
+
+
+def coordinates_for(addresses):
+    """Возвращает координаты (широта, долгота) для адресов, None — если неизвестны.
+
+    Адреса сравниваются по каноническому ключу и ищутся сначала в памяти
+    процесса, затем в общем кэше и только потом одним запросом в Location.
+    Ненайденные адреса тоже кэшируются, но на меньший срок.
+    """
+    addresses_by_key = {}
+    for address in addresses:
+        if address and address.strip():
+            addresses_by_key.setdefault(normalize_address(address), []).append(address.strip())
+
+    found = {}
+    missing_keys = {}
+    for canonical_address in addresses_by_key:
+        value = local_cache.get(canonical_address)
+        if value is None:
+            missing_keys[get_cache_key(canonical_address)] = canonical_address
+        else:
+            found[canonical_address] = value
+
+    if missing_keys:
+        for key, value in cache.get_many(missing_keys).items():
+            canonical_address = missing_keys.pop(key)
+            found[canonical_address] = value
+            local_cache.set(canonical_address, value)
+
+    if missing_keys:
+        locations = Location.objects.filter(
+            canonical_address__in=missing_keys.values(),
+            latitude__isnull=False,
+            longitude__isnull=False,
+        ).values_list('canonical_address', 'latitude', 'longitude')
+        from_db = {
+            canonical_address: (latitude, longitude)
+            for canonical_address, latitude, longitude in locations
+        }
+
+        to_cache = {}
+        for key, canonical_address in missing_keys.items():
+            value = from_db.get(canonical_address, NOT_FOUND)
+            found[canonical_address] = value
+            local_cache.set(canonical_address, value)
+            to_cache.setdefault(bool(value), {})[key] = value
+        for is_found, values in to_cache.items():
+            cache.set_many(values, FOUND_TIMEOUT if is_found else NOT_FOUND_TIMEOUT)
+
+    return {
+        address: found[canonical_address] or None
+        for canonical_address, key_addresses in addresses_by_key.items()
+        for address in key_addresses
+    }
+
+
+def get_coordinates(address):
+    """Возвращает координаты одного адреса или None"""
+    if not address or not address.strip():
+        return None
+    return coordinates_for([address])[address.strip()]
+
+
+def forget_coordinates(addresses):
+    """Убирает адреса из кэшей, чтобы следующий запрос прочитал Location"""
+    canonical_addresses = {normalize_address(address) for address in addresses if address}
+    for canonical_address in canonical_addresses:
+        local_cache.delete(canonical_address)
+    cache.delete_many([get_cache_key(canonical_address) for canonical_address in canonical_addresses])
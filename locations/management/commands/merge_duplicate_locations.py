@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from locations.utils import merge_duplicate_locations
+
+
+class Command(BaseCommand):
+    help = 'Склеивает местоположения, адреса которых совпадают после нормализации'
+
+    def handle(self, *args, **options):
+        deleted = merge_duplicate_locations()
+        self.stdout.write(
+            self.style.SUCCESS(f'Удалено дублей местоположений: {deleted}')
+        )
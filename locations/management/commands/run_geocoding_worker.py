@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from locations.utils import process_geocoding_queue
+
+
+class Command(BaseCommand):
+    help = 'Обрабатывает очередь геокодирования адресов заказов и ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=20,
+            help='Сколько задач забирать из очереди за раз',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Сколько адресов пачки геокодировать одновременно',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь до конца и выйти',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            tasks = process_geocoding_queue(options['batch_size'], options['concurrency'])
+            for task in tasks:
+                self.stdout.write(f"{task.address}: {task.get_status_display()}")
+
+            if tasks:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
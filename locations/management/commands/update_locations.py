@@ -6,6 +6,31 @@ from foodcartapp.models import Order, Restaurant
 class Command(BaseCommand):
     help = 'Обновляет координаты для всех заказов и ресторанов'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Количество потоков геокодирования',
+        )
+        parser.add_argument(
+            '--rps',
+            type=float,
+            default=10,
+            help='Максимум запросов к геокодеру в секунду (квота Яндекса)',
+        )
+        parser.add_argument(
+            '--only-missing',
+            action='store_true',
+            help='Пропускать адреса, для которых координаты уже известны',
+        )
+        parser.add_argument(
+            '--progress-every',
+            type=int,
+            default=100,
+            help='Как часто печатать прогресс, в адресах',
+        )
+
     def handle(self, *args, **options):
 
         order_addresses = set(Order.objects.values_list('address', flat=True))
@@ -14,8 +39,19 @@ class Command(BaseCommand):
 
         self.stdout.write(f"Найдено {len(all_addresses)} уникальных адресов для геокодирования")
 
-
-        updated_locations = batch_update_locations(all_addresses)
+        def report_progress(done, total, elapsed):
+            if done % options['progress_every'] and done != total:
+                return
+            throughput = done / elapsed if elapsed else 0
+            self.stdout.write(f"Геокодировано {done}/{total}, {throughput:.1f} адр/с")
+
+        updated_locations = batch_update_locations(
+            all_addresses,
+            workers=options['workers'],
+            rate=options['rps'],
+            only_missing=options['only_missing'],
+            progress=report_progress,
+        )
 
         self.stdout.write(
             self.style.SUCCESS(
@@ -0,0 +1,85 @@
+import re
+
+from django.db import migrations, models
+
+
+# Копия locations.normalization на момент миграции: будущие правки
+# нормализации не должны менять то, что делает эта миграция
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-кт': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+TOKEN_RE = re.compile(r'\w+(?:-\w+)*')
+
+
+def normalize_address(address):
+    if not address:
+        return ''
+    address = address.casefold().replace('ё', 'е')
+    tokens = TOKEN_RE.findall(address)
+    return ' '.join(ABBREVIATIONS.get(token, token) for token in tokens)
+
+
+def fill_canonical_addresses(apps, schema_editor):
+    """Заполняем канонические адреса и склеиваем дубли Location"""
+    Location = apps.get_model('locations', 'Location')
+
+    locations_by_key = {}
+    for location in Location.objects.order_by('id').iterator(chunk_size=1000):
+        locations_by_key.setdefault(normalize_address(location.address), []).append(location)
+
+    duplicate_ids = []
+    kept_locations = []
+    for key, locations in locations_by_key.items():
+        locations.sort(key=lambda location: (
+            location.latitude is not None and location.longitude is not None,
+            location.updated_at,
+        ), reverse=True)
+        kept_location, *duplicates = locations
+        kept_location.canonical_address = key
+        kept_locations.append(kept_location)
+        duplicate_ids.extend(duplicate.id for duplicate in duplicates)
+
+    Location.objects.filter(id__in=duplicate_ids).delete()
+    Location.objects.bulk_update(kept_locations, ['canonical_address'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_geocodingtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='canonical_address',
+            field=models.CharField(editable=False, max_length=255, null=True, verbose_name='канонический адрес'),
+        ),
+        migrations.RunPython(fill_canonical_addresses, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='location',
+            name='canonical_address',
+            field=models.CharField(editable=False, max_length=255, unique=True, verbose_name='канонический адрес'),
+        ),
+    ]
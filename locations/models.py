@@ -1,6 +1,8 @@
 from django.db import models
 from django.utils import timezone
 
+from .normalization import normalize_address
+
 
 class Location(models.Model):
     address = models.CharField(
@@ -8,6 +10,12 @@ class Location(models.Model):
         max_length=200,
         unique=True
     )
+    canonical_address = models.CharField(
+        'канонический адрес',
+        max_length=255,
+        unique=True,
+        editable=False
+    )
     latitude = models.FloatField(
         'Широта',
         null=True,
@@ -39,6 +47,10 @@ class Location(models.Model):
     def __str__(self):
         return f"{self.address} ({self.latitude}, {self.longitude})"
 
+    def save(self, *args, **kwargs):
+        self.canonical_address = normalize_address(self.address)
+        super().save(*args, **kwargs)
+
     def needs_geocoding(self):
         """Проверяет, нуждается ли адрес в геокодировании"""
         if self.latitude is None or self.longitude is None:
@@ -50,3 +62,54 @@ class Location(models.Model):
             return True
 
         return False
+
+
+class GeocodingTask(models.Model):
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'В очереди'),
+        (PROCESSING, 'Обрабатывается'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    address = models.CharField(
+        'адрес',
+        max_length=200,
+        unique=True
+    )
+    status = models.CharField(
+        'статус',
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+        db_index=True
+    )
+    attempts = models.PositiveIntegerField(
+        'попыток',
+        default=0
+    )
+    last_error = models.TextField(
+        'последняя ошибка',
+        blank=True
+    )
+    created_at = models.DateTimeField(
+        'дата создания',
+        auto_now_add=True,
+        db_index=True
+    )
+    updated_at = models.DateTimeField(
+        'дата обновления',
+        auto_now=True
+    )
+
+    class Meta:
+        verbose_name = 'задача геокодирования'
+        verbose_name_plural = 'задачи геокодирования'
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.address} ({self.get_status_display()})"
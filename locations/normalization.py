@@ -0,0 +1,42 @@
+import re
+
+
+ABBREVIATIONS = {
+    'г': 'город',
+    'обл': 'область',
+    'р-н': 'район',
+    'мкр': 'микрорайон',
+    'мкрн': 'микрорайон',
+    'ул': 'улица',
+    'пр-т': 'проспект',
+    'просп': 'проспект',
+    'пр-кт': 'проспект',
+    'пер': 'переулок',
+    'пл': 'площадь',
+    'ш': 'шоссе',
+    'наб': 'набережная',
+    'б-р': 'бульвар',
+    'бул': 'бульвар',
+    'туп': 'тупик',
+    'д': 'дом',
+    'к': 'корпус',
+    'корп': 'корпус',
+    'стр': 'строение',
+    'кв': 'квартира',
+}
+
+TOKEN_RE = re.compile(r'\w+(?:-\w+)*')
+
+
+def normalize_address(address):
+    """Приводит адрес к каноническому ключу для поиска дублей.
+
+    «Москва, ул. Тверская, д.1» и «москва  улица тверская дом 1» дают
+    одинаковый ключ: регистр и «ё» выравниваются, знаки препинания и
+    лишние пробелы убираются, сокращения раскрываются.
+    """
+    if not address:
+        return ''
+    address = address.casefold().replace('ё', 'е')
+    tokens = TOKEN_RE.findall(address)
+    return ' '.join(ABBREVIATIONS.get(token, token) for token in tokens)
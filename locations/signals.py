@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .lookup import forget_coordinates
+from .models import Location
+
+
+# Отправляется после массовых изменений Location, которые не вызывают
+# post_save: аргумент canonical_addresses — затронутые канонические адреса.
+locations_changed = Signal()
+
+
+@receiver([post_save, post_delete], sender=Location)
+def invalidate_coordinates(sender, instance, **kwargs):
+    """Сбрасывает закэшированные координаты адреса при изменении Location"""
+    forget_coordinates([instance.address])
@@ -1,6 +1,13 @@
+from unittest import mock
+
+from django.core.cache import cache
 from django.test import TestCase
-from .models import Location
+from .models import GeocodingTask, Location
 from .address_check import check_address_exists, batch_check_addresses
+from .geocoder import GazetteerGeocoder, GeocoderError
+from .lookup import coordinates_for, get_coordinates, local_cache
+from .normalization import normalize_address
+from .utils import GEOCODING_TASK_MAX_ATTEMPTS, enqueue_geocoding, merge_duplicate_locations, process_geocoding_queue
 
 
 class AddressCheckTestCase(TestCase):
@@ -33,3 +40,126 @@ class AddressCheckTestCase(TestCase):
         self.assertEqual(result["Москва, Красная площадь"], True)
         self.assertEqual(result["Неизвестный адрес"], False)
         self.assertEqual(result["Несуществующий адрес"], False)
+
+
+class CoordinatesLookupTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        Location.objects.create(
+            address="Москва, Красная площадь",
+            latitude=55.7539,
+            longitude=37.6208
+        )
+
+    def test_lookup_caches_found_and_missing_addresses(self):
+        """Тест поиска координат через кэши, включая ненайденные адреса"""
+        addresses = ["москва,  красная площадь", "Москва, Тверская 1"]
+        with self.assertNumQueries(1):
+            result = coordinates_for(addresses)
+        self.assertEqual(result, {
+            "москва,  красная площадь": (55.7539, 37.6208),
+            "Москва, Тверская 1": None,
+        })
+
+        # Другой процесс со своей памятью берет координаты из общего кэша
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(coordinates_for(addresses), result)
+
+    def test_saved_location_replaces_cached_miss(self):
+        """Тест сброса закэшированного промаха при сохранении Location"""
+        self.assertIsNone(get_coordinates("Москва, Тверская 1"))
+        Location.objects.create(address="Москва, Тверская 1", latitude=55.76, longitude=37.61)
+        self.assertEqual(get_coordinates("москва, тверская 1"), (55.76, 37.61))
+
+
+class GeocodingQueueTestCase(TestCase):
+    def test_concurrent_batch(self):
+        """Тест одновременного геокодирования пачки задач"""
+        geocoder = GazetteerGeocoder(entries={"Москва, Арбат 1": (55.75, 37.59)})
+        enqueue_geocoding(["Москва, Арбат 1", "Неизвестный адрес"])
+
+        with mock.patch('locations.utils.get_geocoder', return_value=geocoder):
+            tasks = process_geocoding_queue(concurrency=5)
+
+        self.assertEqual({task.status for task in tasks}, {GeocodingTask.DONE})
+        self.assertEqual(geocoder.metrics.snapshot()['calls'], 2)
+        location = Location.objects.get(address="Москва, Арбат 1")
+        self.assertEqual((location.latitude, location.longitude), (55.75, 37.59))
+        self.assertIsNone(Location.objects.get(address="Неизвестный адрес").latitude)
+
+    def test_finished_tasks_are_requeued(self):
+        """Тест повторной постановки выполненной и проваленной задачи"""
+        GeocodingTask.objects.bulk_create([
+            GeocodingTask(address="Москва, Арбат 1", status=GeocodingTask.DONE),
+            GeocodingTask(
+                address="Москва, Арбат 2", status=GeocodingTask.FAILED,
+                attempts=5, last_error="Геокодер недоступен",
+            ),
+            GeocodingTask(address="Москва, Арбат 3", status=GeocodingTask.PROCESSING, attempts=1),
+        ])
+        geocoder = GazetteerGeocoder(entries={"Москва, Арбат 1": (55.75, 37.59)})
+
+        for _ in range(6):
+            enqueue_geocoding(["Москва, Арбат 1", "Москва, Арбат 2", "Москва, Арбат 3"], requeue=True)
+            with mock.patch('locations.utils.get_geocoder', return_value=geocoder):
+                tasks = process_geocoding_queue()
+            self.assertEqual({task.address for task in tasks}, {"Москва, Арбат 1", "Москва, Арбат 2"})
+
+        tasks = GeocodingTask.objects.in_bulk(field_name='address')
+        self.assertEqual(tasks["Москва, Арбат 2"].attempts, 0)
+        self.assertEqual(tasks["Москва, Арбат 2"].last_error, "")
+        self.assertEqual(tasks["Москва, Арбат 3"].status, GeocodingTask.PROCESSING)
+
+    def test_page_views_do_not_reset_failing_task(self):
+        """Тест: просмотр страниц не сбрасывает попытки падающей задачи"""
+        geocoder = mock.Mock()
+        geocoder.geocode.side_effect = GeocoderError("403 Forbidden")
+
+        for _ in range(GEOCODING_TASK_MAX_ATTEMPTS + 2):
+            enqueue_geocoding(["Москва, Арбат 4"])
+            with mock.patch('locations.utils.get_geocoder', return_value=geocoder):
+                process_geocoding_queue()
+
+        task = GeocodingTask.objects.get(address="Москва, Арбат 4")
+        self.assertEqual(task.status, GeocodingTask.FAILED)
+        self.assertEqual(geocoder.geocode.call_count, GEOCODING_TASK_MAX_ATTEMPTS)
+
+
+class AddressNormalizationTestCase(TestCase):
+    def test_normalize_address(self):
+        """Тест приведения написаний одного адреса к общему ключу"""
+        canonical = "москва улица тверская дом 1"
+        for address in [
+            "Москва, ул. Тверская, д.1",
+            "москва  улица тверская дом 1",
+            "МОСКВА, УЛ ТВЕРСКАЯ, Д 1",
+        ]:
+            with self.subTest(address=address):
+                self.assertEqual(normalize_address(address), canonical)
+        self.assertEqual(normalize_address("Королёв, пр-т Космонавтов"), "королев проспект космонавтов")
+        # «пр.» бывает и проездом, поэтому не раскрывается
+        self.assertNotEqual(
+            normalize_address("Москва, Рязанский пр., 2"),
+            normalize_address("Москва, Рязанский проспект, 2"),
+        )
+        self.assertEqual(normalize_address(""), "")
+        self.assertEqual(normalize_address(None), "")
+
+    def test_merge_duplicate_locations(self):
+        """Тест склейки Location, чьи адреса стали давать один ключ"""
+        Location.objects.bulk_create([
+            Location(address="Москва, ул. Тверская, д.1", canonical_address="старый ключ 1"),
+            Location(
+                address="москва улица тверская дом 1", canonical_address="старый ключ 2",
+                latitude=55.76, longitude=37.61,
+            ),
+            Location(address="Москва, Арбат 1", canonical_address="москва арбат 1"),
+        ])
+
+        self.assertEqual(merge_duplicate_locations(), 1)
+
+        kept = Location.objects.get(canonical_address="москва улица тверская дом 1")
+        self.assertEqual((kept.latitude, kept.longitude), (55.76, 37.61))
+        self.assertEqual(Location.objects.count(), 2)
@@ -1,40 +1,281 @@
-from .models import Location
-from .geocoder import fetch_coordinates
-from django.conf import settings
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+
+from .models import Location, GeocodingTask
+from .geocoder import GeocoderError, TokenBucket, ageocode_many, create_geocoder, get_geocoder
+from .lookup import forget_coordinates
+from .normalization import normalize_address
+from .signals import locations_changed
+from asgiref.sync import async_to_sync
+from django.db import transaction
 from django.utils import timezone
 
 
-def get_or_create_location(address):
-    """Получает или создает Location для адреса"""
+logger = logging.getLogger(__name__)
+
+GEOCODING_TASK_MAX_ATTEMPTS = 5
+GEOCODING_TASK_LEASE = timedelta(minutes=10)
+
+
+def get_or_create_location(address, geocode=None):
+    """Получает или создает Location для адреса.
+
+    Если адрес нужно геокодировать, а геокодер недоступен, пробрасывает
+    GeocoderError, чтобы вызывающий код мог повторить попытку позже.
+    Вместо общего геокодера можно передать свою функцию geocode.
+    """
     if not address:
         return None
 
     normalized_address = address.strip()
 
     location, created = Location.objects.get_or_create(
-        address=normalized_address,
-        defaults={}
+        canonical_address=normalize_address(normalized_address),
+        defaults={'address': normalized_address}
     )
 
     if created or location.needs_geocoding():
-        try:
-            coords = fetch_coordinates(settings.YANDEX_GEOCODER_APIKEY, normalized_address)
-            if coords:
-                location.longitude, location.latitude = coords
-            location.last_geocode_attempt = timezone.now()
-            location.save()
-        except Exception as e:
-            print(f"Ошибка геокодирования для адреса {normalized_address}: {e}")
+        coords = (geocode or get_geocoder().geocode)(normalized_address)
+        if coords:
+            location.latitude, location.longitude = coords
+        location.last_geocode_attempt = timezone.now()
+        location.save()
 
     return location
 
 
-def batch_update_locations(addresses):
-    """Пакетное обновление координат для списка адресов"""
-    locations = []
-    for address in addresses:
-        if address:
-            location = get_or_create_location(address)
-            if location:
-                locations.append(location)
-    return locations
+def batch_update_locations(addresses, workers=1, rate=None, only_missing=False,
+                           progress=None, batch_size=500):
+    """Пакетное обновление координат для списка адресов.
+
+    Адреса геокодируются в пуле из `workers` потоков через общую сессию,
+    не чаще `rate` запросов в секунду. Координаты сохраняются пачками.
+    """
+    addresses_by_key = {
+        normalize_address(address): address.strip()
+        for address in addresses if address and address.strip()
+    }
+    locations = Location.objects.in_bulk(addresses_by_key, field_name='canonical_address')
+
+    to_geocode = []
+    for key, address in addresses_by_key.items():
+        location = locations.get(key)
+        if location is None:
+            location = locations[key] = Location(address=address, canonical_address=key)
+        elif only_missing and location.latitude is not None and location.longitude is not None:
+            continue
+        elif not location.needs_geocoding():
+            continue
+        to_geocode.append(location)
+
+    limiter = TokenBucket(rate) if rate else None
+    geocoder = create_geocoder(pool_size=workers) if workers > 1 else get_geocoder()
+
+    def geocode(location):
+        if limiter:
+            limiter.acquire()
+        try:
+            return location, geocoder.geocode(location.address)
+        except GeocoderError as e:
+            logger.warning("Ошибка геокодирования адреса %s: %s", location.address, e)
+            return location, e
+
+    geocoded = []
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(geocode, location) for location in to_geocode]
+        for done, future in enumerate(as_completed(futures), start=1):
+            location, coords = future.result()
+            if not isinstance(coords, GeocoderError):
+                if coords:
+                    location.latitude, location.longitude = coords
+                location.last_geocode_attempt = timezone.now()
+                geocoded.append(location)
+
+            if len(geocoded) >= batch_size:
+                save_locations(geocoded)
+                geocoded = []
+            if progress:
+                progress(done, len(to_geocode), time.monotonic() - started_at)
+    save_locations(geocoded)
+    if geocoder is not get_geocoder():
+        geocoder.close()
+
+    return list(locations.values())
+
+
+def save_locations(locations):
+    """Сохраняет новые и обновленные Location двумя запросами"""
+    new_locations = [location for location in locations if location.pk is None]
+    old_locations = [location for location in locations if location.pk is not None]
+    Location.objects.bulk_create(new_locations)
+    for location in old_locations:
+        location.updated_at = timezone.now()
+    Location.objects.bulk_update(
+        old_locations,
+        ['latitude', 'longitude', 'last_geocode_attempt', 'updated_at'],
+    )
+    forget_coordinates(location.address for location in locations)
+    locations_changed.send(
+        sender=Location,
+        canonical_addresses={location.canonical_address for location in locations},
+    )
+
+
+def enqueue_geocoding(addresses, requeue=False):
+    """Ставит новые адреса в очередь на геокодирование одним запросом.
+
+    Уже известные задачи не трогаются. С requeue=True они еще и снова
+    попадают в очередь со сброшенными попытками, кроме тех, что сейчас
+    обрабатывает воркер: так делается для адресов новых заказов, а не
+    при просмотре страниц, иначе адрес, на котором геокодер всегда
+    падает, запрашивался бы без ограничения попыток.
+    """
+    addresses_by_key = {
+        normalize_address(address): address.strip()
+        for address in addresses if address and address.strip()
+    }
+    if not addresses_by_key:
+        return
+    if requeue:
+        (
+            GeocodingTask.objects
+            .filter(address__in=addresses_by_key.values())
+            .exclude(status=GeocodingTask.PROCESSING)
+            .update(status=GeocodingTask.PENDING, attempts=0, last_error='', updated_at=timezone.now())
+        )
+    GeocodingTask.objects.bulk_create(
+        [GeocodingTask(address=address) for address in addresses_by_key.values()],
+        ignore_conflicts=True,
+    )
+
+
+def claim_geocoding_tasks(limit):
+    """Забирает задачи из очереди, чтобы их не взял другой воркер"""
+    now = timezone.now()
+    with transaction.atomic():
+        tasks = list(
+            GeocodingTask.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                status__in=[GeocodingTask.PENDING, GeocodingTask.PROCESSING],
+                attempts__lt=GEOCODING_TASK_MAX_ATTEMPTS,
+            )
+            .exclude(
+                status=GeocodingTask.PROCESSING,
+                updated_at__gte=now - GEOCODING_TASK_LEASE,
+            )
+            .order_by('created_at')[:limit]
+        )
+        GeocodingTask.objects.filter(id__in=[task.id for task in tasks]).update(
+            status=GeocodingTask.PROCESSING,
+            updated_at=now,
+        )
+    return tasks
+
+
+def geocode_concurrently(addresses, concurrency):
+    """Заранее геокодирует адреса, которым это нужно, через асинхронный клиент.
+
+    Возвращает функцию для get_or_create_location: она отдает готовый
+    результат, а для адресов вне пачки обращается к геокодеру как обычно.
+    """
+    addresses_by_key = {
+        normalize_address(address): address.strip()
+        for address in addresses if address and address.strip()
+    }
+    locations = Location.objects.in_bulk(addresses_by_key, field_name='canonical_address')
+    to_geocode = [
+        address for key, address in addresses_by_key.items()
+        if key not in locations or locations[key].needs_geocoding()
+    ]
+    geocoder = get_geocoder()
+
+    async def geocode_batch():
+        try:
+            return await ageocode_many(geocoder, to_geocode, concurrency)
+        finally:
+            # Цикл событий async_to_sync закроется, клиент с ним не переживет
+            await geocoder.aclose()
+
+    results = async_to_sync(geocode_batch)()
+
+    def geocode(address):
+        if address not in results:
+            return get_geocoder().geocode(address)
+        result = results[address]
+        if isinstance(result, GeocoderError):
+            raise result
+        return result
+
+    return geocode
+
+
+def run_geocoding_task(task, geocode=None):
+    """Геокодирует адрес задачи и сохраняет результат в Location"""
+    task.attempts += 1
+    try:
+        get_or_create_location(task.address, geocode=geocode)
+    except Exception as e:
+        task.last_error = str(e)
+        if task.attempts >= GEOCODING_TASK_MAX_ATTEMPTS:
+            task.status = GeocodingTask.FAILED
+        else:
+            task.status = GeocodingTask.PENDING
+    else:
+        task.attempts = 0
+        task.last_error = ''
+        task.status = GeocodingTask.DONE
+    task.save(update_fields=['attempts', 'last_error', 'status', 'updated_at'])
+    return task
+
+
+def process_geocoding_queue(batch_size=20, concurrency=1):
+    """Обрабатывает одну пачку задач геокодирования.
+
+    При concurrency больше 1 адреса пачки геокодируются одновременно,
+    и пачка ждет самого долгого ответа, а не суммы всех.
+    """
+    tasks = claim_geocoding_tasks(batch_size)
+    geocode = None
+    if concurrency > 1 and tasks:
+        geocode = geocode_concurrently([task.address for task in tasks], concurrency)
+    return [run_geocoding_task(task, geocode=geocode) for task in tasks]
+
+
+def merge_duplicate_locations():
+    """Склеивает Location с одинаковым каноническим адресом.
+
+    Из каждой группы остается запись с координатами, а среди таких —
+    обновленная последней. Возвращает количество удаленных дублей.
+    """
+    locations_by_key = {}
+    for location in Location.objects.order_by('id').iterator(chunk_size=1000):
+        locations_by_key.setdefault(normalize_address(location.address), []).append(location)
+
+    duplicates = []
+    changed_locations = []
+    for key, locations in locations_by_key.items():
+        locations.sort(key=lambda location: (
+            location.latitude is not None and location.longitude is not None,
+            location.updated_at,
+        ), reverse=True)
+        kept_location, *key_duplicates = locations
+        duplicates.extend(key_duplicates)
+        if kept_location.canonical_address != key:
+            kept_location.canonical_address = key
+            changed_locations.append(kept_location)
+
+    with transaction.atomic():
+        Location.objects.filter(id__in=[location.id for location in duplicates]).delete()
+        Location.objects.bulk_update(changed_locations, ['canonical_address'], batch_size=500)
+    forget_coordinates(location.address for location in duplicates + changed_locations)
+    locations_changed.send(
+        sender=Location,
+        canonical_addresses={
+            location.canonical_address for location in duplicates + changed_locations
+        },
+    )
+    return len(duplicates)
@@ -1,3 +1,89 @@
-from django.test import TestCase
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from foodcartapp.models import Order, OrderEvent
+
+
+class ManagerPagesQueryCountTestCase(TestCase):
+    """Число запросов страниц менеджера не зависит от объема данных"""
+
+    def setUp(self):
+        cache.clear()
+        manager = User.objects.create_superuser('manager', 'manager@example.com', 'manager')
+        self.client.force_login(manager)
+
+    def count_queries(self, url_name):
+        self.client.get(reverse(url_name))
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def generate_data(self, orders, seed):
+        call_command(
+            'generate_bench_data',
+            products=40,
+            restaurants=10,
+            orders=orders,
+            seed=seed,
+            stdout=StringIO(),
+        )
+        cache.clear()
+
+    def test_query_count_is_constant(self):
+        for url_name in ['restaurateur:view_orders', 'restaurateur:ProductsView']:
+            with self.subTest(url_name=url_name):
+                self.generate_data(orders=5, seed=1)
+                small = self.count_queries(url_name)
+                self.generate_data(orders=60, seed=2)
+                self.assertEqual(self.count_queries(url_name), small)
+
+
+class OrderFeedTestCase(TestCase):
+    def setUp(self):
+        manager = User.objects.create_superuser('manager', 'manager@example.com', 'manager')
+        self.client.force_login(manager)
+        self.orders = [
+            Order.objects.create(
+                firstname='Иван', lastname='Петров', phonenumber='+79291000000',
+                address=f'Москва, Арбат {number}',
+            )
+            for number in range(3)
+        ]
+
+    @override_settings(ORDER_FEED_TIMEOUT=0.01, ORDER_FEED_POLL_INTERVAL=0)
+    async def test_feed_streams_events_after_cursor(self):
+        first_event = await self.orders[0].events.aget()
+        await self.async_client.aforce_login(await User.objects.aget(username='manager'))
+        response = await self.async_client.get(
+            reverse('restaurateur:view_orders_feed'),
+            headers={'Last-Event-ID': str(first_event.id)},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertNotIn(f'"order_id": {self.orders[0].id},', content)
+        for order in self.orders[1:]:
+            self.assertIn(f'"order_id": {order.id},', content)
+
+    def test_feed_under_wsgi_returns_without_waiting(self):
+        last_event = OrderEvent.objects.latest('id')
+        response = self.client.get(
+            reverse('restaurateur:view_orders_feed'),
+            headers={'Last-Event-ID': str(last_event.id)},
+        )
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(response.content.decode(), 'retry: 2000\n\n')
+
+    def test_rows_render_only_requested_orders(self):
+        ids = f'{self.orders[0].id},{self.orders[2].id}'
+        response = self.client.get(reverse('restaurateur:view_order_rows'), {'ids': ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'class="order-row"', count=2)
+        self.assertNotContains(response, f'data-order="{self.orders[1].id}"')
@@ -14,6 +14,9 @@ urlpatterns = [
 
 
     path('orders/', views.view_orders, name="view_orders"),
+    path('orders/json/', views.view_orders_json, name="view_orders_json"),
+    path('orders/rows/', views.view_order_rows, name="view_order_rows"),
+    path('orders/feed/', views.view_orders_feed, name="view_orders_feed"),
 
     path('login/', views.LoginView.as_view(), name="login"),
     path('logout/', views.LogoutView.as_view(), name="logout"),
@@ -1,18 +1,26 @@
+from collections import defaultdict
+from datetime import datetime
+
 from django import forms
 from django.shortcuts import redirect, render
 from django.views import View
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import user_passes_test
-from django.db.models import Prefetch
-from foodcartapp.models import Order, OrderItem, Product, Restaurant, \
-    RestaurantMenuItem
+from django.core.paginator import Paginator
+from django.db.models import Prefetch, Q, prefetch_related_objects
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from foodcartapp.events import get_latest_event_id, poll_order_events, stream_order_events
+from foodcartapp.candidates import OPEN_ORDER_STATUSES, refresh_order_candidates
+from foodcartapp.matching import get_restaurant_matcher
+from foodcartapp.order_status import allowed_statuses
+from foodcartapp.models import Order, OrderCandidate, OrderItem, Product, ProductCategory, \
+    Restaurant, RestaurantMenuItem
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
-from locations.utils import get_or_create_location, batch_update_locations
-from collections import defaultdict
-from geopy.distance import distance
 from locations.models import Location
-from locations.utils import get_or_create_location
+from locations.normalization import normalize_address
+from locations.utils import enqueue_geocoding
 
 
 class Login(forms.Form):
@@ -63,28 +71,62 @@ class LogoutView(auth_views.LogoutView):
     next_page = reverse_lazy('restaurateur:login')
 
 
+ORDERS_PAGE_SIZE = 50
+ORDER_ROWS_LIMIT = 100
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+PRODUCTS_PAGE_SIZE = 100
+UNCATEGORIZED = 'none'
+
+
 def is_manager(user):
     return user.is_staff
 
 
 
+def get_products_categories():
+    """Возвращает вкладки категорий для страницы меню: (ключ, название)"""
+    categories = [
+        (str(category.id), category.name)
+        for category in ProductCategory.objects.order_by('name')
+    ]
+    if Product.objects.filter(category__isnull=True).exists():
+        categories.append((UNCATEGORIZED, 'Без категории'))
+    return categories
+
+
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_products(request):
     restaurants = list(Restaurant.objects.order_by('name'))
-    products = list(Product.objects.prefetch_related('menu_items'))
-
-    products_with_restaurant_availability = []
-    for product in products:
-        availability = {item.restaurant_id: item.availability for item in product.menu_items.all()}
-        ordered_availability = [availability.get(restaurant.id, False) for restaurant in restaurants]
-
-        products_with_restaurant_availability.append(
-            (product, ordered_availability)
-        )
+    restaurant_ids = [restaurant.id for restaurant in restaurants]
+
+    categories = get_products_categories()
+    category_keys = [key for key, _ in categories]
+    current_category = request.GET.get('category')
+    if current_category not in category_keys:
+        current_category = category_keys[0] if category_keys else UNCATEGORIZED
+
+    products = Product.objects.select_related('category').order_by('name', 'id')
+    if current_category == UNCATEGORIZED:
+        products = products.filter(category__isnull=True)
+    else:
+        products = products.filter(category_id=current_category)
+    page = Paginator(products, PRODUCTS_PAGE_SIZE).get_page(request.GET.get('page'))
+
+    matcher = get_restaurant_matcher()
+    products_with_restaurant_availability = [
+        (product, list(zip(
+            restaurant_ids,
+            matcher.restaurant_availability(product.id, restaurant_ids),
+        )))
+        for product in page
+    ]
 
     return render(request, template_name="products_list.html", context={
         'products_with_restaurant_availability': products_with_restaurant_availability,
         'restaurants': restaurants,
+        'categories': categories,
+        'current_category': current_category,
+        'page': page,
     })
 
 
@@ -96,88 +138,133 @@ def view_restaurants(request):
 
 
 def get_addresses_coordinates(addresses):
-    """Получает координаты для всех адресов сразу"""
-
-    coordinates_dict = {}
+    """Читает координаты адресов из Location, не обращаясь к геокодеру.
 
-    existing_locations = Location.objects.filter(address__in=addresses)
-    for location in existing_locations:
-        if location.latitude and location.longitude:
-            coordinates_dict[location.address] = (location.latitude, location.longitude)
+    Адреса, которые ещё не геокодировались, ставятся в очередь и
+    возвращаются отдельным множеством.
+    """
+    coordinates_dict = dict.fromkeys(addresses)
+    pending_addresses = set(addresses)
 
+    addresses_by_key = defaultdict(list)
     for address in addresses:
-        if address not in coordinates_dict:
-            location = get_or_create_location(address)
-            if location and location.latitude and location.longitude:
-                coordinates_dict[address] = (location.latitude, location.longitude)
-            else:
-                coordinates_dict[address] = None
+        addresses_by_key[normalize_address(address)].append(address)
+
+    existing_locations = Location.objects.filter(
+        canonical_address__in=addresses_by_key
+    ).values_list('canonical_address', 'latitude', 'longitude', 'last_geocode_attempt')
+    for canonical_address, latitude, longitude, last_geocode_attempt in existing_locations:
+        for address in addresses_by_key[canonical_address]:
+            if latitude is not None and longitude is not None:
+                coordinates_dict[address] = (latitude, longitude)
+            if last_geocode_attempt or coordinates_dict[address]:
+                pending_addresses.discard(address)
+
+    enqueue_geocoding(pending_addresses)
+    return coordinates_dict, pending_addresses
+
+
+class OrdersFilterForm(forms.Form):
+    status = forms.ChoiceField(
+        label='Статус', required=False,
+        choices=[('', 'Все')] + [
+            (status, label) for status, label in Order.STATUS_CHOICES
+            if status in OPEN_ORDER_STATUSES
+        ],
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан', required=False,
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Все',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    payment_method = forms.ChoiceField(
+        label='Оплата', required=False,
+        choices=[('', 'Все')] + Order.PAYMENT_METHOD_CHOICES,
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    after = forms.CharField(required=False, widget=forms.HiddenInput)
 
-    return coordinates_dict
+    def clean_after(self):
+        cursor = self.cleaned_data['after']
+        if not cursor:
+            return None
+        try:
+            return parse_orders_cursor(cursor)
+        except ValueError:
+            raise forms.ValidationError('Некорректный курсор страницы')
 
 
-def calculate_distance(coord1, coord2):
-    """Рассчитывает расстояние между двумя координатами"""
-    if not coord1 or not coord2:
-        return None
+def format_orders_cursor(order):
+    return f"{order.created_at.isoformat()},{order.id}"
 
-    try:
-        return distance(coord1, coord2).km
-    except Exception:
-        return None
 
+def parse_orders_cursor(cursor):
+    created_at, order_id = cursor.rsplit(',', 1)
+    return datetime.fromisoformat(created_at), int(order_id)
 
-@user_passes_test(is_manager, login_url='restaurateur:login')
-def view_orders(request):
-    orders = Order.objects.exclude(
-        status__in=['completed', 'canceled']
-    ).select_related('cooking_restaurant').prefetch_related(
-        Prefetch('items', queryset=OrderItem.objects.select_related('product'))
-    ).with_total_cost().order_by('-created_at')
-
-    order_addresses = set(orders.values_list('address', flat=True))
-    restaurant_addresses = set(Restaurant.objects.values_list('address', flat=True))
-    all_addresses = order_addresses.union(restaurant_addresses)
-
-    coordinates_dict = get_addresses_coordinates(all_addresses)
-
-    all_restaurants = Restaurant.objects.prefetch_related(
-        Prefetch('menu_items',
-                 queryset=RestaurantMenuItem.objects.filter(availability=True)
-                 .select_related('product'))
+
+def get_orders_page(filters):
+    """Возвращает страницу необработанных заказов и курсор следующей.
+
+    Страницы отсчитываются по ключу (created_at, id), поэтому стоимость
+    запроса не зависит от того, насколько далеко пролистан список.
+    """
+    orders = Order.objects.filter(status__in=OPEN_ORDER_STATUSES)
+
+    if filters.get('status'):
+        orders = orders.filter(status=filters['status'])
+    if filters.get('restaurant'):
+        orders = orders.filter(cooking_restaurant=filters['restaurant'])
+    if filters.get('payment_method'):
+        orders = orders.filter(payment_method=filters['payment_method'])
+    if filters.get('after'):
+        created_at, order_id = filters['after']
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    orders = list(
+        orders.select_related('cooking_restaurant').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).order_by('-created_at', '-id')[:ORDERS_PAGE_SIZE + 1]
     )
 
-    restaurant_products = defaultdict(set)
-    for restaurant in all_restaurants:
-        for menu_item in restaurant.menu_items.all():
-            restaurant_products[restaurant.id].add(menu_item.product.id)
+    next_cursor = None
+    if len(orders) > ORDERS_PAGE_SIZE:
+        orders = orders[:ORDERS_PAGE_SIZE]
+        next_cursor = format_orders_cursor(orders[-1])
+    return orders, next_cursor
 
-    restaurants_dict = {r.id: r for r in all_restaurants}
 
+def build_orders_data(orders):
+    """Собирает для заказов подходящие рестораны и расстояния до них.
 
-    orders_data = []
-    for order in orders:
-        order_product_ids = {item.product.id for item in order.items.all()}
+    Рестораны-кандидаты заранее рассчитаны фоновым обработчиком; устаревшие
+    кандидаты заказов текущей страницы пересчитываются на месте.
+    """
+    refresh_order_candidates(
+        order.id for order in orders
+        if order.candidates_stale and not order.cooking_restaurant
+    )
+    prefetch_related_objects(orders, Prefetch(
+        'candidates',
+        queryset=OrderCandidate.objects.select_related('restaurant'),
+    ))
 
-        available_restaurants = []
-        if not order.cooking_restaurant and order_product_ids:
-            for restaurant_id, available_products in restaurant_products.items():
-                if order_product_ids.issubset(available_products):
-                    restaurant = restaurants_dict[restaurant_id]
-                    available_restaurants.append(restaurant)
+    coordinates_dict, pending_addresses = get_addresses_coordinates(
+        {order.address for order in orders}
+    )
 
+    orders_data = []
+    for order in orders:
         available_restaurants_with_distances = []
-        for restaurant in available_restaurants:
-            distance = calculate_distance(
-                coordinates_dict.get(order.address),
-                coordinates_dict.get(restaurant.address)
-            )
-            available_restaurants_with_distances.append({
-                'restaurant': restaurant,
-                'distance': distance
-            })
-
-        available_restaurants_with_distances.sort(key=lambda x: (x['distance'] is None, x['distance']))
+        if not order.cooking_restaurant:
+            available_restaurants_with_distances = [
+                {'restaurant': candidate.restaurant, 'distance': candidate.distance_km}
+                for candidate in order.candidates.all()
+            ]
 
         order_info = {
             'id': order.id,
@@ -186,6 +273,12 @@ def view_orders(request):
             'phonenumber': order.phonenumber,
             'address': order.address,
             'status': order.get_status_display(),
+            'status_code': order.status,
+            'version': order.version,
+            'next_statuses': [
+                (next_status, STATUS_LABELS[next_status])
+                for next_status in allowed_statuses(order.status)
+            ],
             'payment_method': order.get_payment_method_display(),
             'comment': order.comment or '-',
             'manager_comment': order.manager_comment or '-',
@@ -193,10 +286,11 @@ def view_orders(request):
             'called_at': order.called_at,
             'delivered_at': order.delivered_at,
             'products': [],
-            'total_amount': order.total_cost or 0,
+            'total_amount': order.total,
             'cooking_restaurant': order.cooking_restaurant,
             'available_restaurants': available_restaurants_with_distances,
-            'is_address_found': coordinates_dict.get(order.address) is not None
+            'is_address_found': coordinates_dict.get(order.address) is not None,
+            'is_address_pending': order.address in pending_addresses,
         }
 
         for item in order.items.all():
@@ -205,6 +299,120 @@ def view_orders(request):
 
         orders_data.append(order_info)
 
+    return orders_data
+
+
+def serialize_order_info(order_info):
+    """Готовит данные заказа со страницы менеджера к выдаче в JSON"""
+    restaurant = order_info['cooking_restaurant']
+    return {
+        **order_info,
+        'phonenumber': str(order_info['phonenumber']),
+        'total_amount': str(order_info['total_amount']),
+        'cooking_restaurant': {
+            'id': restaurant.id,
+            'name': restaurant.name,
+        } if restaurant else None,
+        'available_restaurants': [
+            {
+                'id': restaurant_info['restaurant'].id,
+                'name': restaurant_info['restaurant'].name,
+                'distance': restaurant_info['distance'],
+            }
+            for restaurant_info in order_info['available_restaurants']
+        ],
+    }
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders(request):
+    form = OrdersFilterForm(request.GET)
+    form.is_valid()
+
+    orders, next_cursor = get_orders_page(form.cleaned_data)
+
+    next_page_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_page_url = f"?{params.urlencode()}"
+
+    first_page_url = None
+    if form.cleaned_data.get('after'):
+        params = request.GET.copy()
+        params.pop('after')
+        first_page_url = f"?{params.urlencode()}"
+
     return render(request, template_name='order_items.html', context={
-        'orders': orders_data
+        'orders': build_orders_data(orders),
+        'filter_form': form,
+        'next_page_url': next_page_url,
+        'first_page_url': first_page_url,
+        'status_labels': STATUS_LABELS,
+        'latest_event_id': get_latest_event_id(),
+        'is_live_page': not any(form.cleaned_data.values()),
+    })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_orders_json(request):
+    form = OrdersFilterForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+
+    orders, next_cursor = get_orders_page(form.cleaned_data)
+
+    return JsonResponse({
+        'orders': [serialize_order_info(order_info) for order_info in build_orders_data(orders)],
+        'next_cursor': next_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+def view_order_rows(request):
+    """Отдает строки таблицы заказов для точечного обновления страницы"""
+    try:
+        order_ids = [int(order_id) for order_id in request.GET.get('ids', '').split(',') if order_id]
+    except ValueError:
+        return HttpResponseBadRequest('Некорректный список заказов')
+
+    orders = list(
+        Order.objects.filter(id__in=order_ids[:ORDER_ROWS_LIMIT])
+        .select_related('cooking_restaurant')
+        .prefetch_related(Prefetch('items', queryset=OrderItem.objects.select_related('product')))
+        .order_by('-created_at', '-id')
+    )
+    return render(request, template_name='order_rows.html', context={
+        'orders': build_orders_data(orders),
     })
+
+
+@user_passes_test(is_manager, login_url='restaurateur:login')
+async def view_orders_feed(request):
+    """Лента изменений заказов в формате server-sent events.
+
+    Браузер сам переподключается и присылает Last-Event-ID, с него лента
+    и продолжается. При первом подключении номер события берется из
+    параметра after, который страница получает вместе с таблицей.
+    Под WSGI-сервером поток занял бы синхронный воркер целиком, поэтому
+    там ответ сразу отдает накопившиеся события и закрывается.
+    """
+    after = request.headers.get('Last-Event-ID') or request.GET.get('after') or 0
+    try:
+        after = int(after)
+    except ValueError:
+        return HttpResponseBadRequest('Некорректный номер события')
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(
+            stream_order_events(after),
+            content_type='text/event-stream',
+        )
+    else:
+        response = HttpResponse(
+            await poll_order_events(after),
+            content_type='text/event-stream',
+        )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
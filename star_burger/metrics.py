@@ -0,0 +1,202 @@
+"""Легкие метрики запросов: задержка, SQL-запросы и обращения к геокодеру.
+
+RequestMetricsMiddleware замеряет каждый запрос, отдает замеры клиенту в
+заголовке Server-Timing и копит их в метриках prometheus_client вместе с
+числом открытых соединений с БД и состоянием пула psycopg. Воркеры
+gunicorn стоят за одним адресом, поэтому под gunicorn метрики пишутся в
+файлы каталога PROMETHEUS_MULTIPROC_DIR, и view metrics складывает
+их по всем воркерам: любой воркер отдает одинаковые монотонные счетчики.
+"""
+import os
+import secrets
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, \
+    generate_latest, multiprocess
+
+from locations.geocoder import geocoder_timings
+
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Показатели пула psycopg из ConnectionPool.pop_stats(): имя, тип, описание
+POOL_STATS = [
+    ('pool_size', 'gauge', 'Соединений в пуле, занятых и свободных'),
+    ('pool_available', 'gauge', 'Свободных соединений в пуле'),
+    ('requests_waiting', 'gauge', 'Запросов, ждущих свободное соединение'),
+    ('requests_num', 'counter', 'Выдач соединений из пула'),
+    ('requests_queued', 'counter', 'Выдач, которым пришлось ждать'),
+    ('requests_wait_ms', 'counter', 'Суммарное ожидание соединения, мс'),
+    ('requests_errors', 'counter', 'Выдач, не дождавшихся соединения'),
+    ('connections_lost', 'counter', 'Соединений, оказавшихся разорванными'),
+]
+
+
+class QueryTimer:
+    """Обертка выполнения SQL: считает запросы и суммарное время в БД"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started_at
+
+
+def database_pools():
+    """Возвращает пулы psycopg по алиасам БД, где пул включен"""
+    return {
+        connection.alias: connection.pool
+        for connection in connections.all()
+        if connection.settings_dict.get('OPTIONS', {}).get('pool')
+    }
+
+
+REQUESTS = Counter('http_requests_total', 'Обработанные запросы', ['view', 'method', 'status'])
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Время обработки запроса', ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+DB_QUERIES = Counter('db_queries_total', 'SQL-запросы при обработке запросов', ['view'])
+DB_QUERY_SECONDS = Counter('db_query_seconds_total', 'Время в БД при обработке запросов', ['view'])
+GEOCODER_CALLS = Counter('geocoder_calls_total', 'Обращения к геокодеру при обработке запросов', ['view'])
+GEOCODER_SECONDS = Counter('geocoder_seconds_total', 'Ожидание геокодера при обработке запросов', ['view'])
+DB_CONNECTIONS_OPENED = Counter('db_connections_opened_total', 'Открытые соединения с БД', ['alias'])
+
+# Текущее состояние пула складывается по живым воркерам, накопительные
+# показатели забираются через pop_stats и прибавляются к счетчикам
+POOL_METRICS = {
+    stat: (
+        Counter(f'db_pool_{stat}', help_text, ['alias']) if kind == 'counter'
+        else Gauge(f'db_pool_{stat}', help_text, ['alias'], multiprocess_mode='livesum')
+    )
+    for stat, kind, help_text in POOL_STATS
+}
+
+
+def connection_opened(sender, connection, **kwargs):
+    """Считает новые соединения с БД: частые переподключения видны сразу"""
+    DB_CONNECTIONS_OPENED.labels(connection.alias).inc()
+
+
+connection_created.connect(connection_opened, dispatch_uid='metrics_connection_opened')
+
+
+def observe(view, method, status, seconds, queries, db_seconds, geocoder):
+    REQUESTS.labels(view, method, str(status)).inc()
+    REQUEST_DURATION.labels(view).observe(seconds)
+    DB_QUERIES.labels(view).inc(queries)
+    DB_QUERY_SECONDS.labels(view).inc(db_seconds)
+    GEOCODER_CALLS.labels(view).inc(len(geocoder))
+    GEOCODER_SECONDS.labels(view).inc(sum(geocoder))
+
+
+def collect_pool_stats():
+    for alias, pool in database_pools().items():
+        stats = pool.pop_stats()
+        for stat, kind, _ in POOL_STATS:
+            metric = POOL_METRICS[stat].labels(alias)
+            if kind == 'counter':
+                metric.inc(stats.get(stat, 0))
+            else:
+                metric.set(stats.get(stat, 0))
+
+
+def render():
+    """Отдает метрики всех воркеров в текстовом формате Prometheus"""
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def wrap_connections(query_timer):
+    """Подключает query_timer ко всем соединениям с БД текущего потока"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(query_timer))
+    return stack
+
+
+class RequestMetricsMiddleware:
+    """Замеряет запросы и добавляет заголовок Server-Timing.
+
+    Работает и под WSGI, и под ASGI. Соединения с БД у каждого потока
+    свои, поэтому в асинхронном режиме обертка SQL ставится в том потоке,
+    где Django выполняет синхронный код запроса.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        query_timer = QueryTimer()
+        timings = []
+        token = geocoder_timings.set(timings)
+        started_at = time.perf_counter()
+        try:
+            with wrap_connections(query_timer):
+                response = self.get_response(request)
+        finally:
+            geocoder_timings.reset(token)
+        return self.finish(request, response, time.perf_counter() - started_at, query_timer, timings)
+
+    async def __acall__(self, request):
+        query_timer = QueryTimer()
+        timings = []
+        token = geocoder_timings.set(timings)
+        started_at = time.perf_counter()
+        stack = await sync_to_async(wrap_connections)(query_timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            geocoder_timings.reset(token)
+        return self.finish(request, response, time.perf_counter() - started_at, query_timer, timings)
+
+    def finish(self, request, response, elapsed, query_timer, timings):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        if view != 'metrics':
+            observe(
+                view, request.method, response.status_code, elapsed,
+                query_timer.count, query_timer.seconds, timings,
+            )
+            collect_pool_stats()
+
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = ', '.join([
+                f'app;dur={elapsed * 1000:.1f}',
+                f'db;dur={query_timer.seconds * 1000:.1f};desc="{query_timer.count} queries"',
+                f'geocoder;dur={sum(timings) * 1000:.1f};desc="{len(timings)} calls"',
+            ])
+        return response
+
+
+def metrics(request):
+    """Метрики для Prometheus по Bearer-токену; без METRICS_TOKEN адрес закрыт"""
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    expected = f'Bearer {settings.METRICS_TOKEN}'.encode()
+    if not secrets.compare_digest(request.headers.get('Authorization', '').encode(), expected):
+        raise Http404
+    return HttpResponse(render(), content_type=CONTENT_TYPE_LATEST)
@@ -1,11 +1,7 @@
+import importlib.util
 import os
 import dj_database_url
-import rollbar
 from environs import Env
-from dotenv import load_dotenv
-
-
-load_dotenv()
 
 
 env = Env()
@@ -25,6 +21,16 @@ CSRF_TRUSTED_ORIGINS = [
     'http://93.183.82.243',
 ]
 YANDEX_GEOCODER_APIKEY = env('YANDEX_GEOCODER_APIKEY', '')
+GEOCODER_BACKEND = env('GEOCODER_BACKEND', 'locations.geocoder.YandexGeocoder')
+GEOCODER_TIMEOUT = env.float('GEOCODER_TIMEOUT', 10)
+GEOCODER_GAZETTEER_PATH = env('GEOCODER_GAZETTEER_PATH', '')
+GEOCODER_GAZETTEER_DELAY = env.float('GEOCODER_GAZETTEER_DELAY', 0)
+DISTANCE_PRECISION = env('DISTANCE_PRECISION', 'haversine')
+ORDER_CANDIDATES_LIMIT = env.int('ORDER_CANDIDATES_LIMIT', 10)
+ORDER_IDEMPOTENCY_TTL = env.int('ORDER_IDEMPOTENCY_TTL', 60 * 60)
+ORDER_INTAKE_MODE = env('ORDER_INTAKE_MODE', 'sync')
+ORDER_FEED_TIMEOUT = env.float('ORDER_FEED_TIMEOUT', 20)
+ORDER_FEED_POLL_INTERVAL = env.float('ORDER_FEED_POLL_INTERVAL', 1)
 ROLLBAR_ACCESS_TOKEN = env('ROLLBAR_ACCESS_TOKEN', '')
 ENVIRONMENT = env('ENVIRONMENT', 'development')
 
@@ -40,10 +46,10 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'phonenumber_field',
     'rest_framework',
-    'debug_toolbar',
 ]
 
 MIDDLEWARE = [
+    'star_burger.metrics.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,11 +57,29 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'debug_toolbar.middleware.DebugToolbarMiddleware',
-    'rollbar.contrib.django.middleware.RollbarNotifierMiddlewareExcluding404',
-    'rollbar.contrib.django.middleware.RollbarNotifierMiddlewareOnly404',
 ]
 
+# Rollbar подключается только с токеном: middleware сама вызывает
+# rollbar.init при загрузке обработчика запросов, поэтому ни manage.py,
+# ни воркеры очередей пакет не импортируют
+if ROLLBAR_ACCESS_TOKEN:
+    MIDDLEWARE += [
+        'rollbar.contrib.django.middleware.RollbarNotifierMiddlewareExcluding404',
+        'rollbar.contrib.django.middleware.RollbarNotifierMiddlewareOnly404',
+    ]
+
+DEBUG_TOOLBAR = env.bool('DEBUG_TOOLBAR', DEBUG) and importlib.util.find_spec('debug_toolbar') is not None
+
+if DEBUG_TOOLBAR:
+    INSTALLED_APPS.append('debug_toolbar')
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.middleware.clickjacking.XFrameOptionsMiddleware') + 1,
+        'debug_toolbar.middleware.DebugToolbarMiddleware',
+    )
+
+SERVER_TIMING = env.bool('SERVER_TIMING', True)
+METRICS_TOKEN = env('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'star_burger.urls'
 
 DEBUG_TOOLBAR_PANELS = [
@@ -92,6 +116,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'star_burger.wsgi.application'
+ASGI_APPLICATION = 'star_burger.asgi.application'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
@@ -99,19 +124,75 @@ MEDIA_URL = '/media/'
 
 DATABASE_URL = env('DATABASE_URL', default=None)
 
+# Роль процесса: web - gunicorn, worker - воркеры очередей. От нее
+# зависят размер пула и время жизни соединений
+APP_ROLE = env('APP_ROLE', 'web')
+SERVER_MODE = env('SERVER_MODE', 'asgi')
+
+DB_CONN_HEALTH_CHECKS = env.bool('DB_CONN_HEALTH_CHECKS', True)
+DB_POOL = env.bool('DB_POOL', False)
+DB_POOL_MIN_SIZE = env.int('DB_POOL_MIN_SIZE', 1)
+DB_POOL_MAX_SIZE = env.int(f'DB_POOL_SIZE_{APP_ROLE.upper()}', 10 if APP_ROLE == 'web' else 2)
+DB_POOL_TIMEOUT = env.float('DB_POOL_TIMEOUT', 10)
+DB_PGBOUNCER = env.bool('DB_PGBOUNCER', False)
+
+# Пул и PgBouncer сами держат соединения, а под ASGI каждый запрос
+# выполняет синхронный код в своем потоке, и постоянные соединения
+# копились бы по одному на поток. В остальных случаях соединение
+# переиспользуется между запросами
+if DB_POOL or (APP_ROLE == 'web' and SERVER_MODE == 'asgi'):
+    DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', 0)
+else:
+    DB_CONN_MAX_AGE = env.int('DB_CONN_MAX_AGE', 600)
+
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(
+            DATABASE_URL,
+            conn_max_age=DB_CONN_MAX_AGE,
+            conn_health_checks=DB_CONN_HEALTH_CHECKS,
+        )
     }
-    print(f"✅ Используем PostgreSQL: {DATABASE_URL.split('@')[1] if '@' in DATABASE_URL else DATABASE_URL}")
 else:
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {
+                # Сайт и воркеры очередей пишут в один файл: запись ждет
+                # блокировку, а не падает с «database is locked»
+                'timeout': 20,
+                'transaction_mode': 'IMMEDIATE',
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            },
         }
     }
-    print("⚠️  Используем SQLite (DATABASE_URL не найден в .env)")
+
+for database in DATABASES.values():
+    if database['ENGINE'] != 'django.db.backends.postgresql':
+        continue
+    options = database.setdefault('OPTIONS', {})
+    if DB_POOL:
+        # Пул psycopg 3, нужен пакет psycopg[pool]
+        options['pool'] = {
+            'min_size': min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
+    if DB_PGBOUNCER:
+        # В режиме transaction PgBouncer отдает соединение другому клиенту
+        # после каждой транзакции: серверные курсоры и подготовленные
+        # запросы на нем теряются. psycopg2 запросы не подготавливает,
+        # psycopg 3 это нужно запретить
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        if importlib.util.find_spec('psycopg'):
+            options['prepare_threshold'] = None
+
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -158,8 +239,25 @@ ROLLBAR = {
     'root': BASE_DIR,
 }
 
-if ROLLBAR['access_token']:
-    rollbar.init(**ROLLBAR)
-    print(f"✅ Rollbar подключен: {ROLLBAR['environment']}")
-else:
-    print("⚠️  Rollbar не подключен (нет ROLLBAR_ACCESS_TOKEN в .env)")
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'simple': {
+            'format': '[{asctime}] {levelname} {name}: {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'simple',
+        },
+    },
+    'loggers': {
+        'star_burger': {
+            'handlers': ['console'],
+            'level': env('LOG_LEVEL', 'INFO'),
+        },
+    },
+}
@@ -0,0 +1,72 @@
+"""Проверка окружения перед запуском веб-воркеров.
+
+gunicorn вызывает check_startup в мастер-процессе до запуска воркеров.
+Если база или кэш недоступны либо проверки Django находят ошибки, сервер
+не стартует, вместо того чтобы воркеры падали на первых запросах. Так же
+сервер не стартует с несколькими воркерами на кэше в памяти процесса:
+сброс версий каталога, меню и координат не дошел бы до других воркеров.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+STARTUP_CACHE_KEY = 'star_burger:startup-check'
+
+
+class StartupCheckError(Exception):
+    """Окружение не готово к приему запросов"""
+
+
+def check_startup(workers=1):
+    """Проверяет базу, кэш и системные проверки Django.
+
+    Соединения с БД и пулы закрываются в конце: после fork воркеры не
+    должны делить сокеты и потоки пула мастер-процесса.
+    """
+    started_at = time.perf_counter()
+    problems = []
+
+    errors = [
+        message for message in checks.run_checks(include_deployment_checks=not settings.DEBUG)
+        if message.level >= checks.ERROR
+    ]
+    problems.extend(str(error) for error in errors)
+
+    try:
+        for connection in connections.all():
+            connection.ensure_connection()
+    except Exception as e:
+        problems.append(f'База данных недоступна: {e}')
+    finally:
+        connections.close_all()
+        for connection in connections.all():
+            if hasattr(connection, 'close_pool'):
+                connection.close_pool()
+
+    try:
+        cache.set(STARTUP_CACHE_KEY, 'ok', timeout=10)
+        if cache.get(STARTUP_CACHE_KEY) != 'ok':
+            problems.append('Кэш не возвращает записанное значение')
+    except Exception as e:
+        problems.append(f'Кэш недоступен: {e}')
+    if isinstance(caches['default'], LocMemCache) and workers > 1:
+        problems.append(
+            f'Кэш locmem у каждого из {workers} воркеров свой, задайте общий кэш в CACHE_URL'
+        )
+
+    if problems:
+        raise StartupCheckError('; '.join(problems))
+    logger.info(
+        'Проверка окружения пройдена за %.0f мс: база %s, Rollbar %s',
+        (time.perf_counter() - started_at) * 1000,
+        connections['default'].vendor,
+        'подключен' if settings.ROLLBAR_ACCESS_TOKEN else 'не подключен',
+    )
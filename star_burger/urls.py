@@ -21,6 +21,7 @@ from django.shortcuts import render
 from django.http import JsonResponse
 
 from . import settings
+from .metrics import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,9 +29,10 @@ urlpatterns = [
     path('api/', include('foodcartapp.urls')),
     path('manager/', include('restaurateur.urls')),
     path('api-auth/', include('rest_framework.urls')),
+    path('metrics', metrics, name='metrics'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 
-if settings.DEBUG:
+if settings.DEBUG_TOOLBAR:
     import debug_toolbar
     urlpatterns = [
         path('__debug__/', include(debug_toolbar.urls)),